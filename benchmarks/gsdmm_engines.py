@@ -0,0 +1,34 @@
+"""Compare the time per iteration of the python and numpy GSDMM engines.
+
+    python benchmarks/gsdmm_engines.py --data data/20ng.txt --num-topics 40
+"""
+import time
+import argparse
+
+from gensim.corpora import Dictionary
+
+from tomodapi.gsdmm import MovieGroupProcess, VectorizedMovieGroupProcess
+from tomodapi.utils.corpus import input_to_list_tokens
+
+parser = argparse.ArgumentParser(description='Benchmark of the GSDMM sampling engines')
+parser.add_argument('--data', default='data/test.txt', help='Corpus file, one document per line')
+parser.add_argument('--num-topics', type=int, default=20, help='Number of clusters')
+parser.add_argument('--iter', type=int, default=3, help='Sampling iterations')
+parser.add_argument('--seed', type=int, default=5, help='Random seed')
+args = parser.parse_args()
+
+tokens = input_to_list_tokens(args.data)
+id2word = Dictionary(tokens)
+ids = [id2word.doc2idx(doc) for doc in tokens]
+
+print(f'{len(tokens)} documents, {len(id2word)} words, {args.num_topics} clusters')
+print('engine\ts/iter')
+timings = {}
+for engine, cls, docs in [('python', MovieGroupProcess, tokens), ('numpy', VectorizedMovieGroupProcess, ids)]:
+    mgp = cls(K=args.num_topics, n_iters=args.iter, random_state=args.seed)
+    start = time.time()
+    mgp.fit(docs, len(id2word), log=lambda x: None)
+    timings[engine] = (time.time() - start) / args.iter
+    print(f'{engine}\t{timings[engine]:.3f}')
+
+print(f'speedup\t{timings["python"] / timings["numpy"]:.1f}x')
@@ -0,0 +1,38 @@
+"""Measure how preprocess_corpus scales with the number of worker processes.
+
+    python benchmarks/preprocess_scaling.py --data data/ted.txt --limit 5000
+"""
+import os
+import time
+import argparse
+
+from tomodapi.utils.corpus import preprocess_corpus, get_preprocessor
+
+parser = argparse.ArgumentParser(description='Benchmark of the parallel corpus preprocessing')
+parser.add_argument('--data', default='data/test.txt', help='Corpus file, one document per line')
+parser.add_argument('--limit', type=int, default=None, help='Maximum number of documents to use')
+parser.add_argument('--max-workers', type=int, default=os.cpu_count(), help='Maximum number of workers to test')
+parser.add_argument('--chunksize', type=int, default=64, help='Documents sent to a worker at a time')
+args = parser.parse_args()
+
+with open(args.data, encoding='utf-8') as f:
+    corpus = [line.rstrip() for line in f][:args.limit]
+
+# warm up the shared preprocessor, so that the single core run is not penalised by resource loading
+get_preprocessor()
+
+workers = 1
+baseline = None
+print(f'{len(corpus)} documents')
+print('workers\tseconds\tdocs/s\tspeedup')
+while workers <= args.max_workers:
+    start = time.time()
+    for _ in preprocess_corpus(corpus, workers=workers, chunksize=args.chunksize):
+        pass
+    dur = time.time() - start
+    baseline = baseline or dur
+    print(f'{workers}\t{dur:.2f}\t{len(corpus) / dur:.1f}\t{baseline / dur:.2f}x')
+
+    if workers == args.max_workers:
+        break
+    workers = min(workers * 2, args.max_workers)
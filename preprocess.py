@@ -1,10 +1,11 @@
+import os
 from tqdm import tqdm
-from tomodapi.utils.corpus import preprocess
+from tomodapi.utils.corpus import preprocess_corpus
 
 with open('data/20ng.txt') as f:
     corpus = f.readlines()
 
-text = [preprocess(x) + '\n' for x in tqdm(corpus)]
+text = [x + '\n' for x in tqdm(preprocess_corpus(corpus, workers=os.cpu_count()), total=len(corpus))]
 
 with open('data/20ng.txt', 'w') as f:
     f.writelines(text)
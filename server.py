@@ -14,6 +14,8 @@ from tomodapi.abstract_model import AbstractModel
 
 AbstractModel.ROOT = ''
 import tomodapi as models
+from tomodapi.utils.corpus import get_preprocessor
+from tomodapi.utils.daemon import get_worker
 
 __package__ = 'tomodapi'
 
@@ -56,10 +58,17 @@ def custom_ui():
     else:
         return render_template("swagger-ui.html", title=api.title, specs_url=api.specs_url)
 
+# load the shared preprocessor at startup rather than at the first request
+get_preprocessor()
+
 among_regex = r"among <(.+(?:, ?.+)+)>"
 
 model_index = {}
 
+# models whose predictions are served by a long-lived worker, which keeps the loaded model and its inferencer,
+# with the predict arguments using it: the in-process sampler for LDA, the inference session for LFTM
+WORKER_MODELS = {'lda': {'inference': 'numpy'}, 'lftm': {}}
+
 
 def extract_model_id(req):
     _, _, _model_id, _ = req.path.split('/', 3)
@@ -115,6 +124,9 @@ for model in models.__all__:
             print(params)
             results = m.train(*params)
             m.save()
+            if _model_name in WORKER_MODELS:
+                # the worker reloads the new model at the next request
+                get_worker(model_index[_model_name]).shutdown()
             dur = time.time() - start
             print(f'Training {_model_name} done in {dur}')
             # Return results
@@ -144,8 +156,13 @@ for model in models.__all__:
 
             text = request.args.get('text', type=str)
             topn = request.args.get('topn', default=5, type=int)
-            m = model_index[extract_model_id(request)]()
-            results = m.predict(text, topn=topn, preprocessing=True)
+            _model_name = extract_model_id(request)
+            if _model_name in WORKER_MODELS:
+                m = get_worker(model_index[_model_name])
+                results = m.predict(text, topn=topn, preprocessing=True, **WORKER_MODELS[_model_name])
+            else:
+                m = model_index[_model_name]()
+                results = m.predict(text, topn=topn, preprocessing=True)
             dur = time.time() - start
             print(results)
             return make_response(jsonify({'time': dur, 'results': results}), 200)
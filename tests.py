@@ -1,6 +1,18 @@
+import os
 import unittest
 import logging
+import tempfile
+import numpy as np
+from sklearn import metrics
+from gensim.corpora import Dictionary
+from gensim.models.coherencemodel import CoherenceModel
 import tomodapi as models
+from tomodapi.gsdmm import MovieGroupProcess, VectorizedMovieGroupProcess
+from tomodapi.utils.artifacts import corpus_artifacts
+from tomodapi.utils.cache import corpus_cache
+from tomodapi.utils.coherence import reference_cache, reference_coherence, reference_index, word_embedding_coherence
+from tomodapi.utils.corpus import input_to_corpus, input_to_list_string
+from tomodapi.utils.glove import GloveStore
 
 TEST_SENTENCE = 'In the time since the industrial revolution the climate has increasingly been affected by human ' \
                 'activities that are causing global warming and climate change.'
@@ -20,6 +32,91 @@ class MainTest(unittest.TestCase):
             self.assertEqual(res, 'success', '[%s] Problems in training.' % model)
             m.save()
 
+    def test_gsdmm_early_stop(self):
+        for engine in ['python', 'numpy']:
+            m = models.GsdmmModel(tempfile.mkdtemp())
+            res, trace = m.train(data=TEST_CORPUS, num_topics=5, iter=15, engine=engine, random_state=1,
+                                 stop_transfer_rate=1.0, return_trace=True)
+            self.assertEqual(res, 'success', '[%s] Problems in training.' % engine)
+            self.assertLess(len(trace), 15, '[%s] A converged sampling should stop before iter.' % engine)
+
+    def test_gsdmm_vectorized(self):
+        # short docs, so that the scores of MovieGroupProcess, computed without logs, do not underflow
+        docs = [line.split()[:8] for line in open(TEST_CORPUS, 'r') if line.strip()]
+        vocabulary = sorted({w for doc in docs for w in doc})
+        ids = [[vocabulary.index(w) for w in doc] for doc in docs]
+
+        # more clusters than documents, so that some of them stay empty
+        mgp = MovieGroupProcess(K=50, n_iters=5, random_state=1)
+        mgp.fit(docs, len(vocabulary), log=lambda *args: None)
+        vmgp = VectorizedMovieGroupProcess.from_mgp(mgp, vocabulary)
+
+        expected = np.array([mgp.score(doc) for doc in docs])
+        self.assertTrue(np.allclose([vmgp.score(doc) for doc in docs], expected), 'Scores should match MGP ones.')
+        self.assertTrue(np.allclose(vmgp.score_batch(docs), expected, atol=1e-6),
+                        'Batch scores should match MGP ones.')
+
+        # the index holds log(1 + n_z_w / beta) of the populated clusters only
+        self.assertEqual(vmgp.active_clusters.tolist(), np.flatnonzero(mgp.cluster_doc_count).tolist(),
+                         'Only the populated clusters should be indexed.')
+        counts = vmgp.cluster_word_matrix.toarray()[vmgp.active_clusters].T
+        self.assertTrue(np.allclose(vmgp.word_index.toarray(), np.log1p(counts / vmgp.beta)),
+                        'The inverted index should hold the word counts of each cluster.')
+
+        path = tempfile.mkdtemp()
+        vmgp.save(path)
+        loaded = VectorizedMovieGroupProcess.load(path)
+        self.assertIsInstance(loaded.doc_cluster_scores, np.memmap, 'Loaded arrays should be memory-mapped.')
+        self.assertTrue(np.array_equal(loaded.score_batch(docs), vmgp.score_batch(docs)),
+                        'A loaded model should score as the saved one.')
+        self.assertEqual(loaded.cluster_word_distribution, vmgp.cluster_word_distribution,
+                         'A loaded model should have the clusters of the saved one.')
+
+        labels = [VectorizedMovieGroupProcess(K=5, n_iters=5, random_state=1)
+                  .fit(ids, len(vocabulary), log=lambda *args: None) for _ in range(2)]
+        self.assertEqual(labels[0], labels[1], 'The same random_state should give the same clustering.')
+
+    def test_preprocess(self):
+        res = models.preprocess(TEST_SENTENCE)
+        self.assertIsInstance(res, str, 'Preprocessing output should be a string.')
+        self.assertNotIn('the', res.split(), 'Stopwords should be removed.')
+        # output of the original preprocess function, before the Preprocessor
+        self.assertEqual(res, 'time since industrial revolution climate increasingly affected human activity cause '
+                              'global warming climate change', 'Preprocessing output should not change.')
+        self.assertEqual(res, models.Preprocessor()(TEST_SENTENCE),
+                         'Preprocessor instances should behave as the preprocess function.')
+
+    def test_corpus_cache(self):
+        first = input_to_list_string(TEST_CORPUS, preprocessing=True)
+        hits = corpus_cache.hits
+        second = input_to_list_string(TEST_CORPUS, preprocessing=True)
+
+        self.assertEqual(corpus_cache.hits, hits + 1, 'The preprocessed corpus should be read from cache.')
+        self.assertEqual(first, second, 'Cached corpus should match the preprocessed one.')
+
+    def test_corpus_trailing_empty_document(self):
+        data = ['alpha beta', 'gamma beta', '']
+        self.assertEqual(len(input_to_corpus(data)), 3, 'A final empty document should be kept in the cache file.')
+        self.assertEqual(len(list(corpus_artifacts(data).bow)), 3, 'A final empty document should have a BoW.')
+
+    def test_artifact_view(self):
+        texts = list(input_to_corpus(TEST_CORPUS).tokens())
+        artifacts = corpus_artifacts(TEST_CORPUS)
+
+        for params in [{'min_cf': 2}, {'remove_n_most_frequent': 20}]:
+            expected = Dictionary(texts)
+            if 'min_cf' in params:
+                expected.filter_tokens(bad_ids=[i for i, freq in expected.cfs.items() if freq < params['min_cf']])
+            else:
+                expected.filter_n_most_frequent(params['remove_n_most_frequent'])
+
+            dictionary, bow = artifacts.view(**params)
+            self.assertEqual(dictionary.token2id, expected.token2id, '[%s] Wrong pruned dictionary.' % params)
+            self.assertEqual([sorted((int(i), int(c)) for i, c in doc) for doc in bow],
+                             [expected.doc2bow(tokens) for tokens in texts], '[%s] Wrong pruned BoW.' % params)
+            # read-only memory maps, a copy of the pruned BoW would be writeable
+            self.assertFalse(bow.sparse.data.flags.writeable, '[%s] Views should be memory-mapped.' % params)
+
     def test_predict(self):
         for model in models.__all__:
             m = model()
@@ -34,6 +131,50 @@ class MainTest(unittest.TestCase):
                 self.assertIsInstance(res[0], tuple,
                                       '[%s] Predictions should be represented as tuple.' % model)
 
+    def test_predict_batch(self):
+        for model in models.__all__:
+            m = model()
+            try:
+                scores, top = m.predict_batch([TEST_SENTENCE, TEST_SENTENCE], topn=3)
+            except NotImplementedError:
+                continue
+
+            self.assertEqual(scores.shape, (2, len(m.topics)), '[%s] Scores should be a D x K matrix.' % model)
+            self.assertEqual(top.shape, (2, 3), '[%s] Top topics should be a D x topn matrix.' % model)
+
+    def test_lda_inference(self):
+        m = models.LdaModel()
+        texts = [line.strip() for line in open(TEST_CORPUS, 'r') if line.strip()]
+        numpy_dist, mallet_dist = m.check_inference(texts, preprocessing=True)
+
+        self.assertEqual(numpy_dist.shape, mallet_dist.shape, 'Both inferences should give a D x K matrix.')
+        self.assertTrue(np.allclose(numpy_dist.sum(axis=1), 1), 'Topic distributions should sum to 1.')
+        self.assertLess(np.abs(numpy_dist - mallet_dist).mean(), 0.05,
+                        'The numpy inference should match the Mallet one.')
+
+    def test_lftm_empty_document(self):
+        m = models.LftmModel()
+        scores, top = m.predict_batch([TEST_SENTENCE, '', TEST_SENTENCE], topn=3)
+
+        self.assertEqual(scores.shape, (3, len(m.topics)), 'Empty documents should keep their row.')
+        self.assertTrue(np.allclose(scores[1], 1 / len(m.topics)), 'Empty documents should get a uniform prediction.')
+        self.assertEqual(top.shape, (3, 3), 'Top topics should be a D x topn matrix.')
+
+    def test_predict_corpus(self):
+        # chunks larger than the preprocessing chunksize, so that a pool would be started to preprocess them
+        with open(TEST_CORPUS, 'r') as f:
+            lines = f.readlines() * 4
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.writelines(lines)
+
+        # LSI preprocesses the texts by default, also inside the worker processes
+        m = models.LSIModel()
+        res = m.predict_corpus(f.name, topn=3, chunksize=100)
+        self.assertEqual(len(res), len(lines), 'Corpus predictions should have one entry per line.')
+        self.assertEqual(m.predict_corpus(f.name, topn=3, chunksize=100, workers=2), res,
+                         'Predictions in worker processes should match the ones in process.')
+        os.remove(f.name)
+
     def test_topics(self):
         for model in models.__all__:
             m = model()
@@ -64,6 +205,78 @@ class MainTest(unittest.TestCase):
             self.assertIsInstance(res['c_v'], float, '[%s] Coherence output should be a floating point.' % model)
 
 
+    def test_reference_coherence(self):
+        rng = np.random.RandomState(0)
+        vocabulary = ['w%d' % i for i in range(50)]
+        texts = [[vocabulary[min(rng.zipf(1.3), 50) - 1] for _ in range(rng.randint(1, 100))] for _ in range(200)]
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write('\n'.join(' '.join(text) for text in texts) + '\n')
+        topics = [rng.choice(vocabulary[:30], 8, replace=False).tolist() for _ in range(5)]
+
+        index = reference_index(f.name)
+        res = reference_coherence(topics, index, ['c_v', 'c_npmi', 'u_mass'], workers=1)
+        dictionary = Dictionary(texts)
+        for metric in ['c_v', 'c_npmi', 'u_mass']:
+            # gensim counts the sliding windows only in the texts containing a topic word
+            words = {w for topic in topics for w in topic}
+            reference = texts if metric == 'u_mass' else [text for text in texts if words & set(text)]
+            expected = CoherenceModel(topics=topics, texts=reference, dictionary=dictionary, coherence=metric,
+                                      processes=1).get_coherence_per_topic()
+            self.assertTrue(np.allclose(res[metric], expected), '%s should match gensim CoherenceModel.' % metric)
+
+        # same content, so the index is read from the disk cache
+        hits = reference_cache.hits
+        os.utime(f.name, (os.stat(f.name).st_atime, os.stat(f.name).st_mtime + 10))
+        cached = reference_coherence(topics, reference_index(f.name), ['c_v', 'c_npmi', 'u_mass'], workers=1)
+        self.assertEqual(reference_cache.hits, hits + 1, 'The reference index should be read from cache.')
+        for metric in cached:
+            self.assertTrue(np.array_equal(cached[metric], res[metric]), 'Cached index should give the same scores.')
+        os.remove(f.name)
+
+    def test_word_embedding_coherence(self):
+        rng = np.random.RandomState(0)
+        vocabulary = ['w%d' % i for i in range(20)] + ['café', 'naïve']
+        path = tempfile.mkdtemp()
+        with open(os.path.join(path, 'glove.txt'), 'w', encoding='utf-8') as f:
+            for word in vocabulary:
+                f.write(word + ' ' + ' '.join('%.5f' % x for x in rng.randn(10)) + '\n')
+        glove = GloveStore.compile(os.path.join(path, 'glove.txt'), os.path.join(path, 'glove'))
+
+        # duplicate words, unknown words, topics of different lengths and without any valid pair
+        topic_sets = [[['w0', 'w1', 'w2', 'w3'], ['w4', 'w4', 'w5', 'unknown'], ['café', 'naïve', 'w1']],
+                      [['w6', 'oov', 'w6'], ['unknown', 'oov'], ['w7']],
+                      [['w%d' % i for i in rng.choice(22, 9)] for _ in range(5)]]
+        res = word_embedding_coherence(topic_sets, glove)
+
+        for topic_set, scores in zip(topic_sets, res):
+            # the pairwise loop computing c_we before the batched product
+            expected = []
+            for topic in topic_set:
+                score = 0
+                count = 0
+                for word1 in topic:
+                    for word2 in topic:
+                        if word1 == word2: continue
+                        if word1 not in glove or word2 not in glove: continue
+                        score += glove.similarity(word1, word2)
+                        count += 1
+                expected.append(0 if count == 0 else score / count)
+            self.assertTrue(np.allclose(scores, expected), 'c_we should match the pairwise computation.')
+
+    def test_glove_index(self):
+        path = tempfile.mkdtemp()
+        with open(os.path.join(path, 'glove.txt'), 'w', encoding='utf-8') as f:
+            f.write('climate 1 0\nnaïve 0 1\nwarm 1 1\n')
+        glove = GloveStore.compile(os.path.join(path, 'glove.txt'), os.path.join(path, 'glove'))
+
+        self.assertEqual(glove.index(['warm', 'climate', 'naïve']).tolist(), [2, 0, 1],
+                         'Words should be found at their row of the text file.')
+        # cast to the itemsize of the vocabulary, i.e. its longest word, the first two would match climate
+        self.assertEqual(glove.index(['climates', 'climatechange', 'war', 'naïvety']).tolist(), [-1, -1, -1, -1],
+                         'Words longer than the vocabulary ones should not be truncated into a match.')
+        self.assertNotIn('climates', glove, 'Truncated words should not be in the vocabulary.')
+        self.assertEqual(glove.index([]).tolist(), [], 'No words should give no rows.')
+
     def test_corpus_predictions(self):
         for model in models.__all__:
             m = model()
@@ -94,6 +307,23 @@ class MainTest(unittest.TestCase):
             self.assertIsInstance(v, float, '[%s] Evaluate NMI should return a float.' % model)
             self.assertIsInstance(v2, float, '[%s] Evaluate Purity should return a float.' % model)
 
+            res_all = m.evaluate_all(res, labels, bootstrap=100)
+            labels_pred = [x[0][0] if len(x) > 0 else 0 for x in res]
+            contingency = metrics.cluster.contingency_matrix(labels, labels_pred)
+            expected = {'purity': contingency.max(axis=0).sum() / contingency.sum(),
+                        'homogeneity': metrics.homogeneity_score(labels, labels_pred),
+                        'completeness': metrics.completeness_score(labels, labels_pred),
+                        'v-measure': metrics.v_measure_score(labels, labels_pred),
+                        'nmi': metrics.normalized_mutual_info_score(labels, labels_pred)}
+            for average in ['arithmetic', 'min', 'max', 'geometric']:
+                expected['nmi_' + average] = metrics.normalized_mutual_info_score(labels, labels_pred,
+                                                                                  average_method=average)
+            for metric, value in expected.items():
+                self.assertAlmostEqual(res_all[metric], value,
+                                       msg='[%s] evaluate_all %s should match scikit-learn.' % (model, metric))
+            self.assertLessEqual(res_all['purity_ci'][0], res_all['purity_ci'][1],
+                                 '[%s] Confidence intervals should be [low, high].' % model)
+
 
 if __name__ == '__main__':
     unittest.main()
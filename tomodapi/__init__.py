@@ -8,7 +8,7 @@ from .nmf_model import NMFModel
 from .pvtm_model import PvtmModel
 from .ctm_model import CTMModel
 
-from .utils.corpus import preprocess
+from .utils.corpus import preprocess, Preprocessor
 
 __all__ = [
     LftmModel,
@@ -1,18 +1,17 @@
 import numpy as np
 import os
-import pickle
-import gensim
 import logging
-from sklearn.metrics.cluster import contingency_matrix
-from sklearn import metrics
 
-from gensim.test import utils
-from gensim.models import KeyedVectors
-from gensim.scripts.glove2word2vec import glove2word2vec
+from .utils.glove import get_glove
+from .utils.coherence import word_embedding_coherence, reference_coherence, reference_index
+from .utils.evaluation import evaluate_all
+from .utils.prediction import batch_predictions, predict_to_file, read_chunks, to_predictions
 
 
 class AbstractModel:
     ROOT = '.'
+    # if True, the topics with score 0 in `predict_batch` are not predicted
+    sparse_predictions = False
 
     def __init__(self, model_path=None):
         self.model = None
@@ -48,21 +47,46 @@ class AbstractModel:
             :param int topn: Number of most probable topics to return
             :param bool preprocess: If True, execute preprocessing on the document
         """
+        scores, top = self.predict_batch([text], topn=topn, preprocessing=preprocessing)
+        return to_predictions(scores, top, self.sparse_predictions)[0]
+
+    def predict_batch(self, texts, topn=5, preprocessing=False):
+        """Predict the topics of many texts at once
+
+            :param list texts: The texts on which performing the prediction
+            :param int topn: Number of most probable topics to return
+            :param bool preprocessing: If True, execute preprocessing on the documents
+            :returns: a D x K matrix of topic scores, and a D x topn matrix with the most probable topics
+        """
         raise NotImplementedError
 
-    def predict_corpus(self, datapath=ROOT + '/data/test.txt', topn=5):
+    def predict_corpus(self, datapath=ROOT + '/data/test.txt', topn=5, output=None, chunksize=1000, workers=None,
+                       resume=False, **kwargs):
+        """Predict the topics of each line of a corpus file, by chunks of documents given to `predict_batch`
+
+            :param datapath: Path of the corpus, one document per line
+            :param int topn: Number of most probable topics to return
+            :param str output: Path of the output file, NDJSON or .npy. If None, the predictions are returned
+            :param int chunksize: Number of documents predicted at a time
+            :param int workers: Number of processes, each one with its own copy of the model
+            :param bool resume: If True, continue the writing of `output` from its last checkpoint
+            :returns: the lists of (topic, score) of the documents, or the number of documents written in `output`
+        """
         if self.model is None:
             self.load()
 
-        with open(datapath, "r") as datafile:
-            text = [line.rstrip() for line in datafile if line]
+        if output is not None:
+            return predict_to_file(self, datapath, output, topn, chunksize, workers, resume, **kwargs)
 
-        return [self.predict(t, topn=topn) for t in text]
+        predictions = []
+        for scores, top in batch_predictions(self, read_chunks(datapath, chunksize), topn, workers, **kwargs):
+            predictions.extend(to_predictions(scores, top, self.sparse_predictions))
+        return predictions
 
     def train(self, data=ROOT + '/data/test.txt', num_topics=20, preprocessing=False):
         """ Train topic model.
 
-            :param data: The training corpus as path or list of strings
+            :param data: The training corpus as path, list of strings or TokenizedCorpus
             :param int num_topics: The desired number of topics
             :param bool preprocessing: If true, apply preprocessing to the corpus
         """
@@ -98,74 +122,44 @@ class AbstractModel:
         """
         raise NotImplementedError
 
-    def coherence(self, datapath=ROOT + '/data/test.txt', metric='c_v', glove_path='glove/glove.6B.300d.txt'):
+    def coherence(self, datapath=ROOT + '/data/test.txt', metric='c_v', glove_path='glove/glove.6B.300d.txt',
+                  metrics=None):
         """ Get the coherence of the topic mode.
 
         :param datapath: Path of the corpus on which compute the coherence.
         :param metric: Metric for computing the coherence, among <c_v, c_npmi, c_uci, u_mass, c_we>
+        :param str metrics: Comma-separated list of metrics, computed together from the same corpus statistics.
+            If set, `metric` is ignored
          """
-        if metric not in ['c_v', 'c_npmi', 'c_uci', 'u_mass', 'c_we']:
-            raise RuntimeError('Unrecognised metric: ' + metric)
+        if metrics is None:
+            metrics = [metric]
+        elif isinstance(metrics, str):
+            metrics = [m.strip() for m in metrics.split(',') if m.strip()]
+        for m in metrics:
+            if m not in ['c_v', 'c_npmi', 'c_uci', 'u_mass', 'c_we']:
+                raise RuntimeError('Unrecognised metric: ' + m)
 
         topic_words = [x['words'] for x in self.topics]
 
-        self.log.debug('loading dataset')
-        with open(datapath, "r") as datafile:
-            text = [line.rstrip().split() for line in datafile if line]
-
-        dictionary = gensim.corpora.hashdictionary.HashDictionary(text)
-
         results = {}
 
-        if metric == 'c_we':
-
-            if os.path.exists(glove_path.replace('txt', 'pickle')):
-                glove = pickle.load(open(glove_path.replace('txt', 'pickle'), 'rb'))
-            else:
-                w2v = utils.get_tmpfile("w2v")
-                glove2word2vec(glove_path, w2v)
-                glove = KeyedVectors.load_word2vec_format(w2v)
-                pickle.dump(glove, open(glove_path.replace('txt', 'pickle'), 'wb'))
-
-            results['c_we_per_topic'] = []
+        if 'c_we' in metrics:
 
-            for topic in topic_words:
-                score = 0
-                count = 0
-                for word1 in topic:
-                    for word2 in topic:
-                        if word1 == word2: continue
-                        if word1 not in glove or word2 not in glove: continue
-                        score += glove.similarity(word1, word2)
-                        count += 1
+            per_topic = word_embedding_coherence([topic_words], get_glove(glove_path))[0]
 
-                results['c_we_per_topic'].append(0 if count == 0 else score / count)
-            results['c_we'] = np.mean(results['c_we_per_topic'])
-            results['c_we_std'] = np.std(results['c_we_per_topic'])
+            results['c_we_per_topic'] = per_topic.tolist()
+            results['c_we'] = np.mean(per_topic)
+            results['c_we_std'] = np.std(per_topic)
 
-            return results
+        corpus_metrics = [m for m in metrics if m != 'c_we']
+        if corpus_metrics:
+            self.log.debug('loading reference index')
+            per_metric = reference_coherence(topic_words, reference_index(datapath), corpus_metrics)
 
-        while True:
-            try:
-                self.log.debug('creating coherence model')
-                coherence_model = gensim.models.coherencemodel.CoherenceModel(topics=topic_words, texts=text,
-                                                                              dictionary=dictionary,
-                                                                              coherence=metric)
-                coherence_per_topic = coherence_model.get_coherence_per_topic()
-
-                topic_coherence = [coherence_per_topic[i] for i, t in enumerate(self.topics)]
-
-                results[metric + '_per_topic'] = topic_coherence
-                results[metric] = np.nanmean(coherence_per_topic)
-                results[metric + '_std'] = np.nanstd(coherence_per_topic)
-
-                break
-
-            except KeyError as e:
-                key = str(e)[1:-1]
-                for x in topic_words:
-                    if key in x:
-                        x.remove(key)
+            for m, coherence_per_topic in per_metric.items():
+                results[m + '_per_topic'] = coherence_per_topic.tolist()
+                results[m] = np.nanmean(coherence_per_topic)
+                results[m + '_std'] = np.nanstd(coherence_per_topic)
 
         return results
 
@@ -177,24 +171,21 @@ class AbstractModel:
         :param str metric: Metric for computing the evaluation, among <purity, homogeneity, completeness, v-measure, nmi>
         :param str average_method: Only if metric is NMI, the average method among <arithmetic, min, max, geometric>
         """
-
-        unique_labels = list(np.unique(labels_true))
-        l = [unique_labels.index(x) for x in labels_true]
-        if type(labels_pred[0]) == list:
-            p = [x[0][0] if len(x) > 0 else 0 for x in labels_pred]
-        else:
-            p = labels_pred
-
-        if metric == 'purity':
-            cm = contingency_matrix(l, p)
-            return np.sum(np.amax(cm, axis=0)) / np.sum(cm)
-        elif metric == 'homogeneity':
-            return metrics.homogeneity_score(l, p)
-        elif metric == 'completeness':
-            return metrics.completeness_score(l, p)
-        elif metric == 'v-measure':
-            return metrics.v_measure_score(l, p)
-        elif metric == 'nmi':
-            return metrics.normalized_mutual_info_score(l, p, average_method)
-        else:
+        if metric not in ['purity', 'homogeneity', 'completeness', 'v-measure', 'nmi']:
             raise ValueError(f'Unrecognised metrics: {metric}')
+        if metric == 'nmi':
+            metric = 'nmi_' + average_method
+        return self.evaluate_all(labels_pred, labels_true)[metric]
+
+    def evaluate_all(self, labels_pred: list, labels_true: list, bootstrap=0, confidence=0.95, random_state=None):
+        """Evaluation against a ground truth with all the metrics, computed from a single contingency matrix
+
+        :param list labels_pred: Predicted topics
+        :param list labels_true: Ground truth labels
+        :param int bootstrap: Number of bootstrap resamples for the confidence intervals. If 0, no interval is computed
+        :param float confidence: Confidence level of the intervals
+        :param int random_state: Seed of the bootstrap
+        :returns: a dict with purity, homogeneity, completeness, v-measure, nmi and nmi_<average method> for each
+            average method. With bootstrap, also the intervals [low, high] as <metric>_ci
+        """
+        return evaluate_all(labels_pred, labels_true, bootstrap, confidence, random_state)
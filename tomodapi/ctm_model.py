@@ -7,7 +7,8 @@ from contextualized_topic_models.models.ctm import ZeroShotTM, CombinedTM
 from contextualized_topic_models.utils.data_preparation import TopicModelDataPreparation
 from contextualized_topic_models.utils.data_preparation import bert_embeddings_from_list
 
-from .utils.corpus import preprocess, input_to_list_string
+from .utils.corpus import preprocess_corpus, input_to_list_string
+from .utils.prediction import to_predictions
 from .abstract_model import AbstractModel
 
 
@@ -44,7 +45,7 @@ class CTMModel(AbstractModel):
               num_data_loader_workers=0):
         """
         Train the model and generate the results on the corpus
-            :param data: The training corpus as path or list of strings
+            :param data: The training corpus as path, list of strings or TokenizedCorpus
             :param int num_topics: The desired number of topics
             :param bool preprocessing: If true, apply preprocessing to the corpus
             :param string bert_model: BERT pretraining to use (see https://www.sbert.net/docs/pretrained_models.html)
@@ -64,18 +65,14 @@ class CTMModel(AbstractModel):
             :param int num_data_loader_workers: Number of data loader workers (default cpu_count). Set it to 0 if you are using Windows
         """
         self.bert_model = bert_model
-        data = input_to_list_string(data, preprocessing)
-
-        if preprocessing:
-            data_prep = list(map(preprocess, data))
-        else:
-            data_prep = data
+        data = input_to_list_string(data)
+        data_prep = input_to_list_string(data, preprocessing)
 
         indptr = [0]
         indices = []
         ones = []
         vocabulary = {}
-        for d in data:
+        for d in data_prep:
             for term in d.split():
                 index = vocabulary.setdefault(term, len(vocabulary))
                 indices.append(index)
@@ -145,22 +142,31 @@ class CTMModel(AbstractModel):
             :param bool preprocessing: If True, execute preprocessing on the document
             :param int n_trials: Number of inference to compute and average
         """
+        scores, top = self.predict_batch([text], topn=topn, preprocessing=preprocessing)
+        return to_predictions(scores, top)[0]
+
+    def predict_batch(self, texts, topn=10, preprocessing=True, n_samples=20):
+        """Predict the topics of many texts with a single dataset
+
+            :param list texts: The texts on which performing the prediction
+            :param int topn: Number of most probable topics to return
+            :param bool preprocessing: If True, execute preprocessing on the documents
+            :param int n_samples: Number of samples of the topic distribution to average
+            :returns: a D x K matrix of topic scores, and a D x topn matrix with the most probable topics
+        """
         if self.model is None:
             self.load()
 
-        if preprocessing:
-            text_prep = preprocess(text)
-        else:
-            text_prep = text
+        texts_prep = list(preprocess_corpus(texts, workers=1)) if preprocessing else texts
 
         if isinstance(self.model, CombinedTM):
-            testing_dataset = self.qt.transform(text_for_contextual=[text], text_for_bow=[text_prep])
+            testing_dataset = self.qt.transform(text_for_contextual=texts, text_for_bow=texts_prep)
         else:
-            testing_dataset = self.qt.transform(text_for_contextual=[text])
+            testing_dataset = self.qt.transform(text_for_contextual=texts)
 
-        preds = self.model.get_doc_topic_distribution(testing_dataset, n_samples=20)[0]
-        preds = [(i, p) for i, p in enumerate(preds)]
-        return sorted(preds, key=lambda x: -x[1])[:topn]
+        scores = np.asarray(self.model.get_doc_topic_distribution(testing_dataset, n_samples=n_samples))
+        top = np.argsort(-scores, axis=1, kind='stable')[:, :topn]
+        return scores, top
 
     def get_corpus_predictions(self, topn: int = 5):
         """Predict topic of the given text
@@ -3,6 +3,7 @@ import warnings
 
 from .abstract_model import AbstractModel
 from .utils.corpus import input_to_list_string
+from .utils.tokenized import is_tokenized_corpus
 
 
 class Doc2TopicModel(AbstractModel):
@@ -30,7 +31,7 @@ class Doc2TopicModel(AbstractModel):
               return_scores=False):
         """Train Doc2Topic model.
 
-            :param data: The path of the training corpus
+            :param data: The training corpus as path, list of strings or TokenizedCorpus
             :param int num_topics: The desired number of topics
             :param bool preprocessing: If true, apply preprocessing to the corpus
             :param int batch_size: Batch size
@@ -41,7 +42,7 @@ class Doc2TopicModel(AbstractModel):
             :param int word_dim: If set, an extra dense layer is inserted for projecting word vectors onto document vector space
             :param float return_scores: If true, it returns ('success', fmeasure, loss)
         """
-        if preprocessing or type(data) != str:
+        if preprocessing or type(data) != str or is_tokenized_corpus(data):
             data = input_to_list_string(data, preprocessing)
             temp = 'temp.txt'
             with open(temp, 'w') as f:
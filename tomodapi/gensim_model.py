@@ -1,12 +1,17 @@
 import os
 import pickle
+import numpy as np
+from gensim.matutils import corpus2dense
 
 from .abstract_model import AbstractModel
-from .utils.corpus import preprocess
+from .utils.corpus import preprocess_corpus
+from .utils.prediction import to_predictions
 
 
 class GensimModel(AbstractModel):
     """Skeleton for models imported from Gensim"""
+    # gensim transformations are sparse, the topics absent from them are not predicted
+    sparse_predictions = True
 
     def __init__(self, model_path=None):
         super().__init__(model_path)
@@ -45,14 +50,34 @@ class GensimModel(AbstractModel):
             :param int topn: Number of most probable topics to return
             :param bool preprocessing: If True, execute preprocessing on the document
         """
+        scores, top = self.predict_batch([text], topn=topn, preprocessing=preprocessing)
+        return to_predictions(scores, top, self.sparse_predictions)[0]
+
+    def predict_batch(self, texts, topn=10, preprocessing=True):
+        """Predict the topics of many texts with a single transformation of the corpus
+
+            :param list texts: The texts on which performing the prediction
+            :param int topn: Number of most probable topics to return, by absolute value of the score
+            :param bool preprocessing: If True, execute preprocessing on the documents
+            :returns: a D x K matrix of topic scores, and a D x topn matrix with the most probable topics
+        """
         if self.model is None:
             self.load()
 
         if preprocessing:
-            text = preprocess(text)
-        preds = self.model[self.dictionary.doc2bow(text.split())]
+            texts = list(preprocess_corpus(texts, workers=1))
+        bows = [self.dictionary.doc2bow(text.split()) for text in texts]
+
+        scores = corpus2dense(self.model[bows], self.num_topics, num_docs=len(bows), dtype=np.float64).T
+        top = np.argsort(-np.abs(scores), axis=1, kind='stable')[:, :topn]
+        return scores, top
 
-        return sorted(preds, key=lambda x: -abs(x[1]))[:topn]
+    @property
+    def num_topics(self):
+        """Number of topics of the gensim model, read without computing the topic-word matrix"""
+        if self.model is None:
+            self.load()
+        return self.model.num_topics
 
     def get_corpus_predictions(self, topn: int = 5):
         if self.corpus_predictions is None:
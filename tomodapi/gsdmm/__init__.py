@@ -1 +1,2 @@
-from .mgp import MovieGroupProcess
\ No newline at end of file
+from .mgp import MovieGroupProcess
+from .vectorized import VectorizedMovieGroupProcess
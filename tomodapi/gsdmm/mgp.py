@@ -1,10 +1,15 @@
 # Modified from the original
 from numpy import argmax, log, exp, zeros
-from numpy.random import multinomial
+from numpy.random import RandomState
+import time
+import scipy.sparse
+
+from .vectorized import score_batch, log_likelihood, converged
 
 
 class MovieGroupProcess:
-    def __init__(self, K=8, alpha=0.1, beta=0.1, n_iters=30):
+    def __init__(self, K=8, alpha=0.1, beta=0.1, n_iters=30, random_state=None, min_iters=25,
+                 stop_transfer_rate=None, stop_ll_delta=None):
         """
         A MovieGroupProcess is a conceptual model introduced by Yin and Wang 2014 to
         describe their Gibbs sampling algorithm for a Dirichlet Mixture Model for the
@@ -29,11 +34,23 @@ class MovieGroupProcess:
             that students desire to sit with students of similar interests. A high beta means they are less
             concerned with affinity and are more influenced by the popularity of a table
         :param n_iters:
+        :param random_state: int
+            Seed for the random generator
+        :param min_iters: int
+            Iteration after which the sampler is allowed to stop early
+        :param stop_transfer_rate: float
+            If set, stop when the fraction of documents changing cluster in an iteration is at most this value
+        :param stop_ll_delta: float
+            If set, stop when the relative change of the log-likelihood in an iteration is at most this value
         """
         self.K = K
         self.alpha = alpha
         self.beta = beta
         self.n_iters = n_iters
+        self.random_state = random_state
+        self.min_iters = min_iters
+        self.stop_transfer_rate = stop_transfer_rate
+        self.stop_ll_delta = stop_ll_delta
 
         # slots for computed variables
         self.number_docs = None
@@ -42,6 +59,7 @@ class MovieGroupProcess:
         self.cluster_word_count = zeros(K)
         self.cluster_word_distribution = [{} for i in range(K)]
         self.doc_cluster_scores = list()
+        self.trace = []
 
     @staticmethod
     def from_data(K, alpha, beta, D, vocab_size, cluster_doc_count, cluster_word_count, cluster_word_distribution):
@@ -66,15 +84,17 @@ class MovieGroupProcess:
         return mgp
 
     @staticmethod
-    def _sample(p):
+    def _sample(p, rng):
         """
         Sample with probability vector p from a multinomial distribution
         :param p: list
             List of probabilities representing probability vector for the multinomial distribution
+        :param rng: RandomState
+            The random generator
         :return: int
             index of randomly selected output
         """
-        return [i for i, entry in enumerate(multinomial(1, p)) if entry != 0][0]
+        return [i for i, entry in enumerate(rng.multinomial(1, p)) if entry != 0][0]
 
     def fit(self, docs, vocab_size, log=print):
         """
@@ -86,6 +106,7 @@ class MovieGroupProcess:
             cluster label for each document
         """
         alpha, beta, K, n_iters, V = self.alpha, self.beta, self.K, self.n_iters, vocab_size
+        rng = RandomState(getattr(self, 'random_state', None))
 
         D = len(docs)
         self.number_docs = D
@@ -93,7 +114,6 @@ class MovieGroupProcess:
 
         # unpack to easy var names
         m_z, n_z, n_z_w = self.cluster_doc_count, self.cluster_word_count, self.cluster_word_distribution
-        cluster_count = K
         d_z = [None for i in range(len(docs))]
 
         self.doc_cluster_scores = [list() for i in range(len(docs))]
@@ -102,7 +122,7 @@ class MovieGroupProcess:
         for i, doc in enumerate(docs):
 
             # choose a random  initial cluster for the doc
-            z = self._sample([1.0 / K for _ in range(K)])
+            z = self._sample([1.0 / K for _ in range(K)], rng)
             d_z[i] = z
             m_z[z] += 1
             n_z[z] += len(doc)
@@ -112,6 +132,9 @@ class MovieGroupProcess:
                     n_z_w[z][word] = 0
                 n_z_w[z][word] += 1
 
+        # one record per iteration, see `converged`
+        self.trace = []
+        start = time.time()
         for _iter in range(n_iters):
             total_transfers = 0
 
@@ -133,7 +156,7 @@ class MovieGroupProcess:
                 # draw sample from distribution to find new cluster
                 p = self.score(doc)
                 self.doc_cluster_scores[i] = p
-                z_new = self._sample(p)
+                z_new = self._sample(p, rng)
 
                 # transfer doc to the new cluster
                 if z_new != z_old:
@@ -148,16 +171,24 @@ class MovieGroupProcess:
                         n_z_w[z_new][word] = 0
                     n_z_w[z_new][word] += 1
 
-            cluster_count_new = sum([1 for v in m_z if v > 0])
+            cluster_count = sum([1 for v in m_z if v > 0])
             log("In stage %d: transferred %d clusters with %d clusters populated" % (
-                _iter, total_transfers, cluster_count_new))
-            if total_transfers == 0 and cluster_count_new == cluster_count and _iter > 25:
+                _iter, total_transfers, cluster_count))
+            self.trace.append({'iteration': _iter, 'time': time.time() - start, 'transfers': total_transfers,
+                               'clusters': cluster_count, 'log_likelihood': self.log_likelihood()})
+            if converged(self.trace, D, getattr(self, 'min_iters', 25), getattr(self, 'stop_transfer_rate', None),
+                         getattr(self, 'stop_ll_delta', None)):
                 log("Converged.  Breaking out.")
                 break
-            cluster_count = cluster_count_new
         self.cluster_word_distribution = n_z_w
         return d_z
 
+    def log_likelihood(self):
+        """Collapsed log-likelihood of the current clustering state"""
+        counts = [count for cluster in self.cluster_word_distribution for count in cluster.values()]
+        return log_likelihood(self.cluster_doc_count, self.cluster_word_count, counts,
+                              self.alpha, self.beta, self.vocab_size)
+
     def score(self, doc):
         """
         Score a document
@@ -199,6 +230,28 @@ class MovieGroupProcess:
         pnorm = pnorm if pnorm > 0 else 1
         return [pp / pnorm for pp in p]
 
+    def score_batch(self, docs):
+        """
+        Score many documents at once, with the same formula of `score`
+
+        :param docs: list[list[str]]: The token streams of the documents
+        :return: a D x K float32 matrix, where each row is the score of a document
+        """
+        word2id = {}
+        indptr = [0]
+        indices = []
+        counts = []
+        for cluster in self.cluster_word_distribution:
+            for word, count in cluster.items():
+                indices.append(word2id.setdefault(word, len(word2id)))
+                counts.append(count)
+            indptr.append(len(indices))
+        cluster_word_matrix = scipy.sparse.csr_matrix((counts, indices, indptr), shape=(self.K, len(word2id)))
+
+        doc_ids = [[word2id[w] for w in doc if w in word2id] for doc in docs]
+        return score_batch(doc_ids, [len(doc) for doc in docs], cluster_word_matrix, self.cluster_doc_count,
+                           self.cluster_word_count, self.alpha, self.beta, self.vocab_size)
+
     def choose_best_label(self, doc):
         """
         Choose the highest probability label for the input document
@@ -0,0 +1,466 @@
+import os
+import json
+import time
+
+import numpy as np
+import scipy.sparse
+from scipy.special import gammaln
+
+PARAMS_FILE = 'params.json'
+VOCABULARY_FILE = 'vocabulary.npy'
+SCORES_FILE = 'doc_cluster_scores.npy'
+COUNT_FILES = ['cluster_doc_count', 'cluster_word_count']
+MATRIX_FILES = ['data', 'indices', 'indptr']
+PARAMS = ['K', 'alpha', 'beta', 'n_iters', 'random_state', 'number_docs', 'vocab_size']
+
+
+def log_likelihood(cluster_doc_count, cluster_word_count, word_counts, alpha, beta, vocab_size):
+    """ Collapsed log-likelihood log p(z, w) of the Dirichlet Mixture Model for a clustering state.
+
+    :param cluster_doc_count: length K array with the number of documents per cluster
+    :param cluster_word_count: length K array with the number of words per cluster
+    :param word_counts: the non-zero counts of the words in the clusters
+    """
+    m_z = np.asarray(cluster_doc_count, dtype=np.float64)
+    n_z = np.asarray(cluster_word_count, dtype=np.float64)
+    n_z_w = np.asarray(word_counts, dtype=np.float64)
+    K, D, V = len(m_z), m_z.sum(), vocab_size
+
+    ll = gammaln(K * alpha) - gammaln(D + K * alpha) + np.sum(gammaln(m_z + alpha) - gammaln(alpha))
+    ll += np.sum(gammaln(V * beta) - gammaln(n_z + V * beta))
+    ll += np.sum(gammaln(n_z_w + beta) - gammaln(beta))
+    return float(ll)
+
+
+def converged(trace, number_docs, min_iters=25, stop_transfer_rate=None, stop_ll_delta=None):
+    """ Stopping rule of the Gibbs sampler, evaluated on the trace of the iterations so far.
+
+    The sampler stops when no document changes cluster and the number of populated clusters is stable, or when one
+    of the optional thresholds is reached. The rule is checked only after `min_iters` iterations.
+
+    :param trace: list of the iteration records, as {iteration, time, transfers, clusters, log_likelihood}
+    :param number_docs: number of documents in the corpus
+    :param min_iters: iteration after which the sampler is allowed to stop
+    :param stop_transfer_rate: stop when the fraction of documents changing cluster is at most this value
+    :param stop_ll_delta: stop when the relative change of the log-likelihood is at most this value
+    """
+    last = trace[-1]
+    if last['iteration'] <= min_iters or len(trace) < 2:
+        return False
+    previous = trace[-2]
+
+    if last['transfers'] == 0 and last['clusters'] == previous['clusters']:
+        return True
+    if stop_transfer_rate is not None and last['transfers'] <= stop_transfer_rate * number_docs:
+        return True
+    if stop_ll_delta is not None:
+        delta = abs(last['log_likelihood'] - previous['log_likelihood'])
+        if delta <= stop_ll_delta * abs(previous['log_likelihood']):
+            return True
+    return False
+
+
+def score_batch(doc_ids, doc_sizes, cluster_word_matrix, cluster_doc_count, cluster_word_count, alpha, beta,
+                vocab_size):
+    """ Score many documents at once with formula (3) of Yin and Wang 2014.
+
+    The word terms of all the documents are computed with a single sparse product between the document-word count
+    matrix and the log cluster-word counts.
+
+    :param doc_ids: list of list of token ids, i.e. the columns of cluster_word_matrix. Unknown words are excluded
+    :param doc_sizes: the number of tokens of each document, including the unknown words
+    :param cluster_word_matrix: K x V (sparse or dense) matrix of word counts per cluster
+    :param cluster_doc_count: length K array with the number of documents per cluster
+    :param cluster_word_count: length K array with the number of words per cluster
+    :return: a D x K float32 matrix of probabilities
+    """
+    indptr = np.cumsum([0] + [len(doc) for doc in doc_ids])
+    indices = np.fromiter((w for doc in doc_ids for w in doc), dtype=np.int64, count=indptr[-1])
+    doc_sizes = np.asarray(doc_sizes, dtype=np.float64)
+    n_words = cluster_word_matrix.shape[1]
+    X = scipy.sparse.csr_matrix((np.ones(len(indices)), indices, indptr), shape=(len(doc_ids), n_words))
+
+    # log(n + beta) = log(beta) + log1p(n / beta), where the first term is the same for all clusters
+    # and is dropped by the normalisation, while the second one is 0 for the words not in the cluster
+    if scipy.sparse.issparse(cluster_word_matrix):
+        log_counts = cluster_word_matrix.astype(np.float64)
+        log_counts.data = np.log1p(log_counts.data / beta)
+    else:
+        log_counts = np.log1p(cluster_word_matrix / beta)
+    lp = X @ log_counts.T
+    lp = lp.toarray() if scipy.sparse.issparse(lp) else np.asarray(lp)
+
+    a = np.asarray(cluster_word_count, dtype=np.float64) + vocab_size * beta
+    lp += np.log(np.asarray(cluster_doc_count, dtype=np.float64) + alpha)
+    lp -= gammaln(a[None, :] + doc_sizes[:, None]) - gammaln(a)[None, :]
+
+    lp -= lp.max(axis=1, keepdims=True)
+    p = np.exp(lp)
+    p /= p.sum(axis=1, keepdims=True)
+    return p.astype(np.float32)
+
+
+class VectorizedMovieGroupProcess:
+    def __init__(self, K=8, alpha=0.1, beta=0.1, n_iters=30, random_state=None, min_iters=25,
+                 stop_transfer_rate=None, stop_ll_delta=None):
+        """
+        Gibbs sampler for the Dirichlet Mixture Model of Yin and Wang 2014, equivalent to MovieGroupProcess,
+        with the counts stored in integer arrays over token ids.
+
+        The K-way score of a document is computed with vectorized log sums: the numerator terms are read from a
+        precomputed table of log(n + beta), the denominator is expressed with the log-gamma function.
+
+        :param K: int
+            Upper bound on the number of possible clusters
+        :param alpha: float between 0 and 1
+            Alpha controls the probability that a student will join a table that is currently empty
+        :param beta: float between 0 and 1
+            Beta controls the student's affinity for other students with similar interests
+        :param n_iters: int
+            Number of sampling iterations
+        :param random_state: int
+            Seed for the random generator
+        :param min_iters: int
+            Iteration after which the sampler is allowed to stop early
+        :param stop_transfer_rate: float
+            If set, stop when the fraction of documents changing cluster in an iteration is at most this value
+        :param stop_ll_delta: float
+            If set, stop when the relative change of the log-likelihood in an iteration is at most this value
+        """
+        self.K = K
+        self.alpha = alpha
+        self.beta = beta
+        self.n_iters = n_iters
+        self.random_state = random_state
+        self.min_iters = min_iters
+        self.stop_transfer_rate = stop_transfer_rate
+        self.stop_ll_delta = stop_ll_delta
+
+        # slots for computed variables
+        self.number_docs = None
+        self.vocab_size = None
+        self.vocabulary = None
+        self.cluster_doc_count = np.zeros(K, dtype=np.int64)
+        self.cluster_word_count = np.zeros(K, dtype=np.int64)
+        self.cluster_word_matrix = None
+        self.doc_cluster_scores = None
+        self.trace = []
+        self.active_clusters = None
+        self.word_index = None
+        self._word2id = None
+
+    @staticmethod
+    def from_mgp(mgp, vocabulary=None):
+        """
+        Convert a fitted MovieGroupProcess, with the same clustering state and scores
+        :param mgp: MovieGroupProcess
+        :param vocabulary: list of words, giving the token ids. If None, the words which appear in the clusters
+        :return: VectorizedMovieGroupProcess
+        """
+        self = VectorizedMovieGroupProcess(mgp.K, mgp.alpha, mgp.beta, mgp.n_iters, getattr(mgp, 'random_state', None))
+        self.number_docs = mgp.number_docs
+        self.vocab_size = mgp.vocab_size
+        if vocabulary is None:
+            vocabulary = sorted({w for cluster in mgp.cluster_word_distribution for w in cluster})
+        self.vocabulary = list(vocabulary)
+
+        indptr = [0]
+        indices = []
+        data = []
+        for cluster in mgp.cluster_word_distribution:
+            indices.extend(self.word2id[w] for w in cluster)
+            data.extend(cluster.values())
+            indptr.append(len(indices))
+        self.cluster_word_matrix = scipy.sparse.csr_matrix(
+            (np.array(data, dtype=np.int32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int32)),
+            shape=(self.K, len(self.vocabulary)))
+        self.cluster_word_matrix.sort_indices()
+
+        self.cluster_doc_count = np.asarray(mgp.cluster_doc_count, dtype=np.int64)
+        self.cluster_word_count = np.asarray(mgp.cluster_word_count, dtype=np.int64)
+        self.doc_cluster_scores = np.array(mgp.doc_cluster_scores, dtype=np.float32).reshape(-1, self.K)
+        self.trace = list(getattr(mgp, 'trace', []))
+        self.build_index()
+        return self
+
+    def save(self, path):
+        """
+        Write the model as .npy arrays, which `load` can memory-map
+        :param path: folder of the model
+        """
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, PARAMS_FILE), 'w') as f:
+            json.dump({p: getattr(self, p) for p in PARAMS}, f)
+
+        matrix = scipy.sparse.csr_matrix(self.cluster_word_matrix)
+        np.save(os.path.join(path, VOCABULARY_FILE), np.array(self.vocabulary, dtype=str))
+        np.save(os.path.join(path, SCORES_FILE), np.asarray(self.doc_cluster_scores, dtype=np.float32))
+        for name in COUNT_FILES:
+            np.save(os.path.join(path, name + '.npy'), getattr(self, name))
+        for name in MATRIX_FILES:
+            np.save(os.path.join(path, 'cluster_word_%s.npy' % name), getattr(matrix, name))
+
+    @staticmethod
+    def exists(path):
+        return os.path.isfile(os.path.join(path, PARAMS_FILE))
+
+    @staticmethod
+    def load(path, mmap_mode='r'):
+        """
+        Load a model written by `save`
+        :param path: folder of the model
+        :param mmap_mode: memory-map mode for numpy.load. If None, the arrays are read in memory
+        :return: VectorizedMovieGroupProcess
+        """
+        with open(os.path.join(path, PARAMS_FILE)) as f:
+            params = json.load(f)
+
+        self = VectorizedMovieGroupProcess(params['K'], params['alpha'], params['beta'], params['n_iters'],
+                                           params['random_state'])
+        self.number_docs = params['number_docs']
+        self.vocab_size = params['vocab_size']
+        self.vocabulary = np.load(os.path.join(path, VOCABULARY_FILE), mmap_mode=mmap_mode)
+        self.doc_cluster_scores = np.load(os.path.join(path, SCORES_FILE), mmap_mode=mmap_mode)
+        for name in COUNT_FILES:
+            setattr(self, name, np.load(os.path.join(path, name + '.npy')))
+
+        data, indices, indptr = [np.load(os.path.join(path, 'cluster_word_%s.npy' % x), mmap_mode=mmap_mode)
+                                 for x in MATRIX_FILES]
+        self.cluster_word_matrix = scipy.sparse.csr_matrix((data, indices, indptr),
+                                                           shape=(self.K, len(self.vocabulary)), copy=False)
+        self.build_index()
+        return self
+
+    @property
+    def word2id(self):
+        if self._word2id is None:
+            self._word2id = {w: i for i, w in enumerate(np.asarray(self.vocabulary).tolist())}
+        return self._word2id
+
+    @property
+    def cluster_word_distribution(self):
+        """The word counts of each cluster, as a list of {word: count} dicts"""
+        matrix = scipy.sparse.csr_matrix(self.cluster_word_matrix)
+        distribution = []
+        for k in range(self.K):
+            row = slice(matrix.indptr[k], matrix.indptr[k + 1])
+            ids = matrix.indices[row]
+            words = [str(self.vocabulary[i]) for i in ids] if self.vocabulary is not None else ids.tolist()
+            distribution.append(dict(zip(words, matrix.data[row].tolist())))
+        return distribution
+
+    def top_words(self, k, topn=10):
+        """
+        The most frequent words of a cluster
+        :param k: the cluster
+        :param topn: number of words
+        :return: the words and their counts, by decreasing count
+        """
+        row = self.cluster_word_matrix[k]
+        if scipy.sparse.issparse(row):
+            ids, counts = row.indices, row.data
+        else:
+            ids = np.flatnonzero(row)
+            counts = row[ids]
+        order = np.argsort(-counts, kind='stable')[:topn]
+        words = [str(self.vocabulary[i]) for i in ids[order]] if self.vocabulary is not None else ids[order].tolist()
+        return words, counts[order]
+
+    def build_index(self):
+        """
+        Build the inverted index used for scoring: for each word, the populated clusters containing it with
+        log(1 + count / beta). The clusters without documents have no words, so they all get the same score and are
+        left out of the index.
+        """
+        self.active_clusters = np.flatnonzero(np.asarray(self.cluster_doc_count) > 0)
+        index = scipy.sparse.csr_matrix(self.cluster_word_matrix)[self.active_clusters].astype(np.float64)
+        index.data = np.log1p(index.data / self.beta)
+        # words x active clusters
+        self.word_index = index.T.tocsr()
+
+        a = np.asarray(self.cluster_word_count, dtype=np.float64)[self.active_clusters] + self.vocab_size * self.beta
+        self._index_prior = np.log(np.asarray(self.cluster_doc_count, dtype=np.float64)[self.active_clusters]
+                                   + self.alpha)
+        self._index_size = a
+
+    def _score_index(self, word_scores, doc_sizes):
+        """ Normalised formula (3) of Yin and Wang 2014 from the inverted index.
+
+        The terms log(beta) of the words are the same for all the clusters, so they are dropped.
+
+        :param word_scores: D x A matrix, sum(log(1 + n_z_w[w] / beta)) over the doc words for the active clusters
+        :param doc_sizes: length D array with the number of tokens of each doc
+        :return: a D x K matrix of probabilities
+        """
+        doc_sizes = np.asarray(doc_sizes, dtype=np.float64)[:, None]
+        a = self._index_size
+        lp = word_scores + self._index_prior - (gammaln(a + doc_sizes) - gammaln(a))
+
+        # the shared score of the empty clusters
+        n_empty = self.K - len(self.active_clusters)
+        a = self.vocab_size * self.beta
+        lp_empty = np.log(self.alpha) - (gammaln(a + doc_sizes) - gammaln(a))
+
+        lp_max = np.maximum(lp.max(axis=1, keepdims=True, initial=-np.inf), lp_empty if n_empty else -np.inf)
+        p = np.exp(lp - lp_max)
+        p_empty = np.exp(lp_empty - lp_max)
+        norm = p.sum(axis=1, keepdims=True) + n_empty * p_empty
+
+        scores = np.repeat(p_empty / norm, self.K, axis=1)
+        scores[:, self.active_clusters] = p / norm
+        return scores
+
+    def fit(self, docs, vocab_size, log=print):
+        """
+        Cluster the input documents
+        :param docs: list of list
+            list of lists containing the token ids of each document, in range(vocab_size)
+        :param vocab_size: total vocabulary size
+        :return: list of length len(doc)
+            cluster label for each document
+        """
+        beta, K, n_iters, V = self.beta, self.K, self.n_iters, vocab_size
+        rng = np.random.RandomState(self.random_state)
+
+        D = len(docs)
+        self.number_docs = D
+        self.vocab_size = vocab_size
+
+        # each doc as unique ids and counts, so that updates never hit the same cell twice
+        docs = [np.unique(np.asarray(doc, dtype=np.int64), return_counts=True) for doc in docs]
+        docs = [(ids, counts.astype(np.int32)) for ids, counts in docs]
+        doc_sizes = np.array([counts.sum() for _, counts in docs], dtype=np.int64)
+
+        word_freq = np.zeros(V, dtype=np.int64)
+        for ids, counts in docs:
+            word_freq[ids] += counts
+        # log(n + beta) for any count that a word can reach in a cluster
+        log_nw = np.log(np.arange(word_freq.max(initial=0) + 1) + beta)
+
+        m_z, n_z = self.cluster_doc_count, self.cluster_word_count
+        n_z_w = np.zeros((K, V), dtype=np.int32)
+        self.cluster_word_matrix = n_z_w
+        self.doc_cluster_scores = np.zeros((D, K), dtype=np.float32)
+
+        # initialize the clusters
+        d_z = rng.randint(K, size=D)
+        for i, (ids, counts) in enumerate(docs):
+            z = d_z[i]
+            m_z[z] += 1
+            n_z[z] += doc_sizes[i]
+            n_z_w[z, ids] += counts
+
+        # one record per iteration, see `converged`
+        self.trace = []
+        start = time.time()
+        for _iter in range(n_iters):
+            total_transfers = 0
+            thresholds = rng.random_sample(D)
+
+            for i, (ids, counts) in enumerate(docs):
+                # remove the doc from it's current cluster
+                z_old = d_z[i]
+                size = doc_sizes[i]
+                m_z[z_old] -= 1
+                n_z[z_old] -= size
+                n_z_w[z_old, ids] -= counts
+
+                # draw sample from distribution to find new cluster
+                p = self._score_counts(log_nw[n_z_w[:, ids]] @ counts, size, V)
+                self.doc_cluster_scores[i] = p
+                z_new = min(np.searchsorted(np.cumsum(p), thresholds[i], side='right'), K - 1)
+
+                # transfer doc to the new cluster
+                if z_new != z_old:
+                    total_transfers += 1
+
+                d_z[i] = z_new
+                m_z[z_new] += 1
+                n_z[z_new] += size
+                n_z_w[z_new, ids] += counts
+
+            cluster_count = int(np.count_nonzero(m_z))
+            log("In stage %d: transferred %d clusters with %d clusters populated" % (
+                _iter, total_transfers, cluster_count))
+            self.trace.append({'iteration': _iter, 'time': time.time() - start, 'transfers': total_transfers,
+                               'clusters': cluster_count, 'log_likelihood': self.log_likelihood()})
+            if converged(self.trace, D, self.min_iters, self.stop_transfer_rate, self.stop_ll_delta):
+                log("Converged.  Breaking out.")
+                break
+
+        self.build_index()
+        return d_z.tolist()
+
+    def _score_counts(self, log_numerator, doc_size, V):
+        """ Normalised formula (3) of Yin and Wang 2014, vectorised over the clusters.
+
+        :param log_numerator: length K array, sum(log(n_z_w[w] + beta)) over the doc words
+        :param doc_size: number of tokens in the doc
+        :param V: vocabulary size
+        """
+        a = self.cluster_word_count + V * self.beta
+        lp = np.log(self.cluster_doc_count + self.alpha) + log_numerator - (gammaln(a + doc_size) - gammaln(a))
+        p = np.exp(lp - lp.max())
+        return p / p.sum()
+
+    def log_likelihood(self):
+        """Collapsed log-likelihood of the current clustering state"""
+        counts = self.cluster_word_matrix
+        counts = counts.data if scipy.sparse.issparse(counts) else counts[counts > 0]
+        return log_likelihood(self.cluster_doc_count, self.cluster_word_count, counts[counts > 0],
+                              self.alpha, self.beta, self.vocab_size)
+
+    def score(self, doc):
+        """
+        Score a document
+
+        Implements formula (3) of Yin and Wang 2014.
+        http://dbgroup.cs.tsinghua.edu.cn/wangjy/papers/KDD14-GSDMM.pdf
+
+        :param doc: list[str]: The doc token stream, as words or token ids
+        :return: list[float]: A length K probability vector where each component represents
+                              the probability of the document appearing in a particular cluster
+        """
+        if self.vocabulary is not None:
+            doc = [self.word2id.get(w, -1) if isinstance(w, str) else w for w in doc]
+        ids = np.asarray([w for w in doc if w >= 0], dtype=np.int64)
+
+        if self.word_index is None:
+            self.build_index()
+
+        # visit only the index entries of the doc words
+        index = self.word_index
+        starts, ends = index.indptr[ids], index.indptr[ids + 1]
+        lengths = ends - starts
+        positions = np.arange(lengths.sum()) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        word_scores = np.bincount(index.indices[positions], weights=index.data[positions],
+                                  minlength=len(self.active_clusters))
+        return self._score_index(word_scores[None, :], [len(doc)])[0].tolist()
+
+    def score_batch(self, docs):
+        """
+        Score many documents at once
+
+        :param docs: list[list[str]]: The token streams of the documents, as words or token ids
+        :return: a D x K float32 matrix, where each row is the score of a document
+        """
+        if self.vocabulary is not None:
+            docs = [[self.word2id.get(w, -1) if isinstance(w, str) else w for w in doc] for doc in docs]
+        if self.word_index is None:
+            self.build_index()
+
+        indptr = np.cumsum([0] + [sum(1 for w in doc if w >= 0) for doc in docs])
+        indices = np.fromiter((w for doc in docs for w in doc if w >= 0), dtype=np.int64, count=indptr[-1])
+        X = scipy.sparse.csr_matrix((np.ones(len(indices)), indices, indptr),
+                                    shape=(len(docs), self.word_index.shape[0]))
+        word_scores = (X @ self.word_index).toarray()
+        return self._score_index(word_scores, [len(doc) for doc in docs]).astype(np.float32)
+
+    def choose_best_label(self, doc):
+        """
+        Choose the highest probability label for the input document
+        :param doc: list[str]: The doc token stream
+        :return:
+        """
+        p = self.score(doc)
+        return np.argmax(p), max(p)
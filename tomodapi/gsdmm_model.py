@@ -1,10 +1,21 @@
 import os
 import pickle
-import gensim
+import logging
+import multiprocessing
+import numpy as np
 
 from .abstract_model import AbstractModel
-from .gsdmm import MovieGroupProcess
-from .utils.corpus import preprocess, input_to_list_string
+from .gsdmm import MovieGroupProcess, VectorizedMovieGroupProcess
+from .utils.corpus import preprocess_corpus, input_to_list_tokens
+from .utils.artifacts import corpus_artifacts
+from .utils.prediction import to_predictions
+
+MIN_ITER = 5
+
+
+def _fit_chain(mgp, docs, vocab_size):
+    mgp.fit(docs, vocab_size, log=logging.getLogger(GsdmmModel.__name__).debug)
+    return mgp
 
 
 class GsdmmModel(AbstractModel):
@@ -15,6 +26,7 @@ class GsdmmModel(AbstractModel):
 
     def __init__(self, model_path=AbstractModel.ROOT + '/models/gsdmm/'):
         super().__init__(model_path)
+        self.chains = None
 
     def train(self,
               data=AbstractModel.ROOT + '/data/test.txt',
@@ -22,39 +34,107 @@ class GsdmmModel(AbstractModel):
               preprocessing=False,
               alpha=0.1,
               beta=0.1,
-              iter=15):
+              iter=15,
+              engine='python',
+              random_state=None,
+              n_chains=1,
+              workers=None,
+              keep_chains=False,
+              min_iter=None,
+              stop_transfer_rate=None,
+              stop_ll_delta=None,
+              return_trace=False):
         """Train GSDMM model.
 
-            :param data: The path of the training corpus
+            :param data: The training corpus as path, list of strings or TokenizedCorpus
             :param int num_topics: The desired number of topics (upper bound)
             :param bool preprocessing: If true, apply preprocessing to the corpus
             :param float alpha: Prior document-topic distribution
             :param float beta: Prior topic-word distribution
             :param int iter: Sampling iterations for the latent feature topic models
+            :param str engine: Sampling engine among <python, numpy>. The numpy one is much faster on large corpora
+            :param int random_state: Seed for the random generator. Chain i uses random_state + i
+            :param int n_chains: Number of independent chains, run in parallel.
+                The one with the best log-likelihood is kept
+            :param int workers: Number of processes for running the chains.
+                If None, one per chain, up to the cores count
+            :param bool keep_chains: If true, all the chains are available in `chains`, sorted by log-likelihood
+            :param int min_iter: Iteration after which the sampling is allowed to stop early.
+                If None, min(5, iter)
+            :param float stop_transfer_rate: If set, stop when at most this fraction of documents changes topic
+            :param float stop_ll_delta: If set, stop when the relative change of the log-likelihood is at most this
+            :param bool return_trace: If true, it returns ('success', trace), where trace has a record per iteration
+                with iteration, time, transfers, clusters and log_likelihood
         """
-        self.model = MovieGroupProcess(K=num_topics, alpha=alpha, beta=beta, n_iters=iter)
+        if engine not in ['python', 'numpy']:
+            raise ValueError('Engine should be python (default) or numpy.')
+
+        if min_iter is None:
+            min_iter = min(MIN_ITER, iter)
 
-        text = input_to_list_string(data, preprocessing)
-        tokens = [doc.split() for doc in text]
-        id2word = gensim.corpora.Dictionary(tokens)
+        tokens = input_to_list_tokens(data, preprocessing)
+        id2word = corpus_artifacts(data, preprocessing).dictionary
+
+        if random_state is None:
+            seeds = np.random.randint(2 ** 31 - n_chains, size=1)[0] + np.arange(n_chains)
+        else:
+            seeds = random_state + np.arange(n_chains)
+
+        sampler = VectorizedMovieGroupProcess if engine == 'numpy' else MovieGroupProcess
+        chains = []
+        for seed in seeds.tolist():
+            mgp = sampler(K=num_topics, alpha=alpha, beta=beta, n_iters=iter, random_state=seed, min_iters=min_iter,
+                          stop_transfer_rate=stop_transfer_rate, stop_ll_delta=stop_ll_delta)
+            if engine == 'numpy':
+                mgp.vocabulary = [id2word[i] for i in range(len(id2word))]
+            chains.append(mgp)
+
+        if engine == 'numpy':
+            tokens = [id2word.doc2idx(doc) for doc in tokens]
 
         self.log.debug('start training GSDMM')
-        self.model.fit(tokens, len(id2word), log=self.log.debug)
+        if n_chains == 1:
+            chains[0].fit(tokens, len(id2word), log=self.log.debug)
+        else:
+            workers = workers or min(n_chains, os.cpu_count() or 1)
+            with multiprocessing.Pool(workers) as pool:
+                chains = pool.starmap(_fit_chain, [(mgp, tokens, len(id2word)) for mgp in chains])
         self.log.debug('end training GSDMM')
 
-        return 'success'
+        chains = sorted(chains, key=lambda mgp: -mgp.log_likelihood())
+        for mgp in chains:
+            self.log.debug(f'Chain with seed {mgp.random_state}: log-likelihood {mgp.log_likelihood()}')
+
+        # scoring goes through the inverted index of the vectorized sampler
+        self.model = chains[0]
+        if isinstance(self.model, MovieGroupProcess):
+            self.model = VectorizedMovieGroupProcess.from_mgp(self.model, [id2word[i] for i in range(len(id2word))])
+        self.chains = chains if keep_chains else None
+
+        if return_trace:
+            return 'success', self.model.trace
+        else:
+            return 'success'
 
     def save(self, path=None):
         super().save(path)
 
-        with open(os.path.join(self.model_path, 'gsdmm.pkl'), 'wb') as output:
-            pickle.dump(self.model, output, pickle.HIGHEST_PROTOCOL)
+        if isinstance(self.model, MovieGroupProcess):
+            self.model = VectorizedMovieGroupProcess.from_mgp(self.model)
+        self.model.save(self.model_path)
 
     def load(self, path=None):
         super().load(path)
 
+        if VectorizedMovieGroupProcess.exists(self.model_path):
+            self.model = VectorizedMovieGroupProcess.load(self.model_path)
+            return
+
+        # legacy format
         with open(os.path.join(self.model_path, 'gsdmm.pkl'), "rb") as input_file:
             self.model = pickle.load(input_file)
+        if isinstance(self.model, MovieGroupProcess):
+            self.model = VectorizedMovieGroupProcess.from_mgp(self.model)
 
     @property
     def topics(self):
@@ -62,41 +142,48 @@ class GsdmmModel(AbstractModel):
             self.load()
 
         topics = []
-        for i, topic in enumerate(self.model.cluster_word_distribution):
-            current_words = []
-            current_freq = []
-            total = sum(topic.values())
-            for word, freq in sorted(topic.items(), key=lambda item: item[1], reverse=True)[:10]:
-                current_words.append(word)
-                current_freq.append(freq / total)
-
+        for k in range(self.model.K):
+            words, counts = self.model.top_words(k, topn=10)
+            total = self.model.cluster_word_count[k]
             topics.append({
-                'words': current_words,
-                'weights': current_freq
+                'words': list(words),
+                'weights': (counts / total).tolist() if total else []
             })
 
         return topics
 
     def predict(self, text: str, topn=5, preprocessing=False, doc_len=7):
+        scores, top = self.predict_batch([text], topn=topn, preprocessing=preprocessing, doc_len=doc_len)
+        return to_predictions(scores, top)[0]
+
+    def predict_batch(self, texts, topn=5, preprocessing=False, doc_len=7):
+        """Predict the topics of many texts at once
+
+            :param list texts: The texts on which performing the prediction
+            :param int topn: Number of most probable topics to return
+            :param bool preprocessing: If True, execute preprocessing on the documents
+            :param int doc_len: Number of words of each text to consider
+            :returns: a D x K matrix of topic scores, and a D x topn matrix with the most probable topics
+        """
         if self.model is None:
             self.load()
 
         if preprocessing:
-            preprocess(text)
+            texts = list(preprocess_corpus(texts, workers=1))
 
-        # gsdmm works for short text
-        # given the preprocessing, here there is no punctuation nor stopwords
-        # we keep the first N words
-        text = text.split()[0:doc_len]
-
-        results = [(topic, score) for topic, score in enumerate(self.model.score(text))]
-        results = sorted(results, key=lambda kv: kv[1], reverse=True)[:topn]
-        return results
+        scores = self.model.score_batch([text.split()[0:doc_len] for text in texts])
+        top = np.argsort(-scores, axis=1, kind='stable')[:, :topn]
+        return scores, top
 
     def get_corpus_predictions(self, topn=5):
         if self.model is None:
             self.load()
 
-        topics = [[(topic, score) for topic, score in enumerate(doc)] for doc in self.model.doc_cluster_scores]
-        topics = [sorted(doc, key=lambda t: -t[1])[:topn] for doc in topics]
+        scores = self.model.doc_cluster_scores
+        topics = []
+        # by blocks of rows, so that a memory-mapped matrix is never fully loaded
+        for start in range(0, len(scores), 10000):
+            block = np.asarray(scores[start:start + 10000])
+            top = np.argsort(-block, axis=1, kind='stable')[:, :topn]
+            topics.extend([(int(topic), float(block[i, topic])) for topic in row] for i, row in enumerate(top))
         return topics
@@ -1,9 +1,8 @@
-from gensim import corpora
 from gensim.models import HdpModel
 
 from .abstract_model import AbstractModel
 from .gensim_model import GensimModel
-from .utils.corpus import preprocess, input_to_list_string
+from .utils.artifacts import corpus_artifacts
 
 
 class HDPModel(GensimModel):
@@ -33,7 +32,7 @@ class HDPModel(GensimModel):
               random_state=None):
         """
         Train the model and generate the results on the corpus
-            :param data: The training corpus as path or list of strings
+            :param data: The training corpus as path, list of strings or TokenizedCorpus
             :param bool preprocessing: If true, apply preprocessing to the corpus
             :param int max_chunks: Upper bound on how many chunks to process. It wraps around corpus beginning in another corpus pass, if there are not enough chunks in the corpus.
             :param int max_time: Upper bound on time (in seconds) for which model will be trained.
@@ -51,18 +50,8 @@ class HDPModel(GensimModel):
             :param str outputdir: Stores topic and options information in the specified directory.
             :param str random_state: Adds a little random jitter to randomize results around same alpha.
         """
-        data = input_to_list_string(data, preprocessing)
-
-        if preprocessing:
-            data = map(preprocess, data)
-
-        texts = [
-            [token for token in text.split(' ') if len(token) > 0]
-            for text in data
-        ]
-
-        dictionary = corpora.Dictionary(texts)
-        corpus = [dictionary.doc2bow(text) for text in texts]
+        artifacts = corpus_artifacts(data, preprocessing)
+        dictionary, corpus = artifacts.dictionary, artifacts.bow
 
         self.model = HdpModel(corpus, id2word=dictionary,
                               max_chunks=max_chunks,
@@ -81,6 +70,13 @@ class HDPModel(GensimModel):
                               random_state=random_state)
 
         self.dictionary = dictionary
-        self.corpus_predictions = self.model[corpus]
+        self.corpus_predictions = list(self.model[corpus])
 
         return 'success'
+
+    @property
+    def num_topics(self):
+        """Number of topics of the top level truncation"""
+        if self.model is None:
+            self.load()
+        return self.model.m_T
@@ -3,9 +3,13 @@ import pickle
 import gensim
 import shutil
 import tarfile
+import numpy as np
 from urllib import request
 
-from .utils.corpus import preprocess, input_to_list_string
+from .utils.corpus import preprocess_corpus
+from .utils.artifacts import corpus_artifacts
+from .utils.mallet import GibbsInferencer, mallet_infer
+from .utils.prediction import to_predictions
 from .abstract_model import AbstractModel
 
 MALLET_PATH = os.path.join(os.path.dirname(__file__), 'mallet-2.0.8', 'bin', 'mallet')
@@ -34,6 +38,7 @@ class LdaModel(AbstractModel):
 
     def __init__(self, model_path=AbstractModel.ROOT + '/models/lda/'):
         super().__init__(model_path)
+        self.inferencer = None
         mallet_dep_path = os.path.join(self.model_path, 'mallet-dep/')
         os.makedirs(mallet_dep_path, exist_ok=True)
         if not os.path.isfile(MALLET_PATH):
@@ -51,7 +56,7 @@ class LdaModel(AbstractModel):
               topic_threshold=0.0):
         """Train LDA model.
 
-            :param data: The training corpus as path or list of strings
+            :param data: The training corpus as path, list of strings or TokenizedCorpus
             :param int num_topics: The desired number of topics
             :param bool preprocessing: If true, apply preprocessing to the corpus
             :param float alpha: Prior document-topic distribution
@@ -60,15 +65,8 @@ class LdaModel(AbstractModel):
             :param int optimize_interval: Hyperparameter optimization every optimize_interval
             :param float topic_threshold:  Threshold of the probability above which we consider a topic
         """
-        text = input_to_list_string(data, preprocessing)
-
         # Transform documents
-        tokens = [doc.split() for doc in text]
-
-        id2word = gensim.corpora.Dictionary(tokens)
-        id2word.filter_n_most_frequent(20)
-
-        corpus = [id2word.doc2bow(doc) for doc in tokens]
+        id2word, corpus = corpus_artifacts(data, preprocessing).view(remove_n_most_frequent=20)
 
         mallet_dep_path = os.path.join(self.model_path, 'mallet-dep/')
 
@@ -86,6 +84,7 @@ class LdaModel(AbstractModel):
                                                       topic_threshold=topic_threshold)
 
         self.log.debug('end training LDA')
+        self.inferencer = None
 
         return 'success'
 
@@ -105,25 +104,78 @@ class LdaModel(AbstractModel):
             self.model = pickle.load(input_file)
         self.model.mallet_path = MALLET_PATH
         self.model.prefix = os.path.join(self.model_path, 'mallet-dep/')
+        self.inferencer = None
+
+    def get_inferencer(self):
+        """The in-process inferencer, built from the Mallet state at the first call"""
+        if self.model is None:
+            self.load()
+        if self.inferencer is None:
+            self.inferencer = GibbsInferencer.from_mallet(self.model)
+        return self.inferencer
+
+    def predict(self, text, topn=5, preprocessing=False, inference='mallet'):
+        """Predict topic of the given text
+
+            :param text: The text on which performing the prediction
+            :param int topn: Number of most probable topics to return
+            :param bool preprocessing: If True, execute preprocessing on the document
+            :param str inference: Inference engine among <mallet, numpy>. The mallet one runs the Mallet inferencer,
+                the numpy one samples in process from the Mallet state
+        """
+        scores, top = self.predict_batch([text], topn=topn, preprocessing=preprocessing, inference=inference)
+        return to_predictions(scores, top)[0]
+
+    def predict_batch(self, texts, topn=5, preprocessing=False, inference='mallet'):
+        """Predict the topics of many texts at once
+
+            :param list texts: The texts on which performing the prediction
+            :param int topn: Number of most probable topics to return
+            :param bool preprocessing: If True, execute preprocessing on the documents
+            :param str inference: Inference engine among <mallet, numpy>. With mallet, all the texts are inferred
+                with a single run of the Mallet inferencer
+            :returns: a D x K matrix of topic scores, and a D x topn matrix with the most probable topics
+        """
+        if inference not in ['numpy', 'mallet']:
+            raise ValueError('Inference should be mallet (default) or numpy.')
+        if self.model is None:
+            self.load()
+
+        if preprocessing:
+            texts = list(preprocess_corpus(texts, workers=1))
+        bows = [self.model.id2word.doc2bow(text.split()) for text in texts]
+
+        scores = self._infer(bows, inference)
+        top = np.argsort(-scores, axis=1, kind='stable')[:, :topn]
+        return scores, top
+
+    def _infer(self, bows, inference):
+        if inference == 'numpy':
+            return self.get_inferencer().infer(bows)
+        return mallet_infer(self.model, bows)
 
-    def predict(self, text, topn=5, preprocessing=False):
+    def check_inference(self, texts, preprocessing=False):
+        """Compare the topic distributions of the numpy inferencer with the ones of Mallet
+
+            :param list texts: The texts on which performing the prediction
+            :param bool preprocessing: If True, execute preprocessing on the documents
+            :returns: the two D x K matrices of topic distributions, numpy and Mallet
+        """
         if self.model is None:
             self.load()
 
         if preprocessing:
-            text = preprocess(text)
-
-        # Transform document into BoW
-        text = text.split()
-        common_dictionary = self.model.id2word
-        text = common_dictionary.doc2bow(text)
-        # Get topic distribution
-        doc_topic_dist = self.model[text]
-        # Sort to get the top n topics
-        # Structure the results into a dictionary
-        results = sorted(doc_topic_dist, key=lambda kv: kv[1], reverse=True)[:topn]
-
-        return results
+            texts = list(preprocess_corpus(texts, workers=1))
+        bows = [self.model.id2word.doc2bow(text.split()) for text in texts]
+
+        numpy_dist = self._infer(bows, 'numpy')
+        mallet_dist = self._infer(bows, 'mallet')
+
+        difference = np.abs(numpy_dist - mallet_dist).mean()
+        agreement = np.mean(numpy_dist.argmax(axis=1) == mallet_dist.argmax(axis=1))
+        self.log.info(f'numpy and Mallet inference: mean absolute difference {difference}, '
+                      f'top topic agreement {agreement}')
+        return numpy_dist, mallet_dist
 
     def get_corpus_predictions(self, topn: int = 5):
         if self.model is None:
@@ -0,0 +1,161 @@
+"""Compare the trained models on the same reference corpus and ground truth.
+
+    python -m tomodapi.leaderboard --data data/test.txt --labels data/test_labels.txt --output leaderboard.tsv
+"""
+import csv
+import time
+import logging
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from .utils.coherence import reference_coherence, reference_index
+from .utils.corpus import read_lines
+
+METRICS = ['c_v', 'c_npmi', 'c_uci', 'u_mass']
+EVALUATION_METRICS = ['purity', 'nmi']
+
+log = logging.getLogger('leaderboard')
+
+
+def model_name(model_class):
+    """Short name of a model class, as used by the API, e.g. lda for LdaModel"""
+    return model_class.__name__.replace('Model', '').lower()
+
+
+def _run_model(model_class, model_path, sample, labels, preprocessing):
+    """ Load a model and measure it. Executed in a worker process.
+
+    :returns: a dict with the name, the load time, the predict latency, the topics and the evaluation scores of the
+        model, or with the error raised while loading or measuring it. The predict latency is None for the models
+        without prediction
+    """
+    name = model_name(model_class)
+    start = time.time()
+    try:
+        m = model_class() if model_path is None else model_class(model_path)
+        m.load()
+        topics = [t['words'] for t in m.topics]
+        load_time = time.time() - start
+
+        latency = None
+        start = time.time()
+        for text in sample:
+            if isinstance(m.predict(text, topn=1, preprocessing=preprocessing), dict):
+                # {'message': 'not implemented for this model'}
+                break
+        else:
+            latency = (time.time() - start) / max(len(sample), 1)
+
+        row = {'model': name, 'load_time': load_time, 'predict_latency': latency, 'num_topics': len(topics),
+               'topics': topics}
+        if labels is not None:
+            scores = m.evaluate_all(m.get_corpus_predictions(topn=1), labels)
+            for metric in EVALUATION_METRICS:
+                row[metric] = scores[metric]
+    except Exception as e:
+        return {'model': name, 'error': repr(e)}
+    return row
+
+
+def leaderboard(datapath, labels_path=None, metrics=None, models=None, model_paths=None, workers=None,
+                sample_size=20, preprocessing=True):
+    """ Coherence, evaluation and timings of many trained models.
+
+    The models are loaded and measured in parallel worker processes. The reference corpus is indexed once and the
+    labels are read once for all the models, then the coherence of all the models is computed from the same index.
+    The models which can not be loaded or measured, e.g. because they are not trained, are reported with their error
+    and without scores.
+
+    :param str datapath: Path of the reference corpus, used for the coherence and for measuring the predict latency
+    :param str labels_path: Path of the ground truth labels of the training corpus, one per line. If None, the
+        models are not evaluated
+    :param metrics: list of coherence metrics among <c_v, c_npmi, c_uci, u_mass>. If None, all of them
+    :param models: list of model classes. If None, all the models of tomodapi
+    :param dict model_paths: Folder of the model by model name. The models not in it are loaded from their default
+    :param int workers: Number of processes. If None, use all the available cores
+    :param int sample_size: Number of documents of the reference corpus on which measuring the predict latency
+    :param bool preprocessing: If true, preprocess the documents on which measuring the predict latency, for all the
+        models, whatever the default of their `predict`
+    :returns: a list of rows, one per model, sorted by decreasing value of the first coherence metric, the models
+        with an error last
+    """
+    if models is None:
+        from . import __all__ as models
+    metrics = METRICS if metrics is None else metrics
+    model_paths = model_paths or {}
+
+    log.info('indexing the reference corpus')
+    index = reference_index(datapath)
+    sample = [line for _, line in zip(range(sample_size), (x for x in read_lines(datapath) if x))]
+    labels = None if labels_path is None else list(read_lines(labels_path))
+
+    tasks = [(model, model_paths.get(model_name(model)), sample, labels, preprocessing) for model in models]
+    with multiprocessing.Pool(min(workers or len(tasks), len(tasks)) or 1) as pool:
+        results = pool.starmap(_run_model, tasks)
+
+    rows = []
+    for row in results:
+        if 'error' in row:
+            log.warning(f'no scores for {row["model"]}: {row["error"]}')
+            row.update({metric: np.nan for metric in metrics})
+            rows.append(row)
+            continue
+
+        start = time.time()
+        coherences = reference_coherence(row.pop('topics'), index, metrics, workers=workers)
+        for metric in metrics:
+            row[metric] = np.nanmean(coherences[metric])
+        row['coherence_time'] = time.time() - start
+        rows.append(row)
+
+    return sorted(rows, key=lambda r: -np.nan_to_num(r[metrics[0]], nan=-np.inf)) if metrics else rows
+
+
+def table_columns(rows):
+    """Columns of the leaderboard, in order of first appearance, as the rows of the errors have other columns"""
+    columns = []
+    for row in rows:
+        columns += [c for c in row if c not in columns]
+    return columns
+
+
+def write_table(rows, path):
+    """Write the leaderboard as a table, tab separated unless `path` ends with .csv"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, table_columns(rows), delimiter=',' if path.endswith('.csv') else '\t')
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Leaderboard of the trained topic models')
+    parser.add_argument('--data', default='data/test.txt', help='Reference corpus, one document per line')
+    parser.add_argument('--labels', default=None, help='Ground truth labels of the training corpus, one per line')
+    parser.add_argument('--metrics', default=','.join(METRICS), help='Comma-separated coherence metrics')
+    parser.add_argument('--models', default=None, help='Comma-separated model names, e.g. lda,gsdmm. Default all')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes')
+    parser.add_argument('--no-preprocessing', dest='preprocessing', action='store_false',
+                        help='Measure the predict latency without preprocessing the documents')
+    parser.add_argument('--output', default='leaderboard.tsv', help='Output table, .tsv or .csv')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from . import __all__ as models
+    if args.models:
+        names = args.models.split(',')
+        models = [m for m in models if model_name(m) in names]
+
+    rows = leaderboard(args.data, args.labels, metrics=args.metrics.split(','), models=models, workers=args.workers,
+                       preprocessing=args.preprocessing)
+    write_table(rows, args.output)
+    columns = table_columns(rows)
+    print('\t'.join(columns))
+    for row in rows:
+        values = (row.get(c, '') for c in columns)
+        print('\t'.join(f'{v:.4f}' if isinstance(v, float) else str(v) for v in values))
+
+
+if __name__ == '__main__':
+    main()
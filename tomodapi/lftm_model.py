@@ -1,18 +1,22 @@
 import re
 import os
-import pickle
+import tempfile
+import threading
 import subprocess
-import gensim
 import shutil
+import logging
+import numpy as np
 from urllib import request
 from zipfile import ZipFile
 
 from .utils.LoggerWrapper import LoggerWrapper
 from .abstract_model import AbstractModel
-from .utils.corpus import preprocess, input_to_list_string
+from .utils.corpus import preprocess_corpus, input_to_list_string
+from .utils.artifacts import corpus_artifacts
+from .utils.glove import get_glove
+from .utils.prediction import to_predictions
 
 LFTM_JAR = os.path.join(os.path.dirname(__file__), 'lftm', 'LFTM.jar')
-GLOVE_TOKENS = os.path.join(os.path.dirname(__file__), 'glove', 'glovetokens.pkl')
 GLOVE_TXT = os.path.join(os.path.dirname(__file__), 'glove', 'glove.6B.50d.txt')
 GLOVE_URI = 'http://nlp.stanford.edu/data/glove.6B.zip'
 GLOVE_FILE = 'glove.zip'
@@ -39,6 +43,77 @@ def download_glove():
     os.remove(GLOVE_FILE)
 
 
+class LftmInferenceSession:
+    """Inference on new documents with a trained LFTM model.
+
+    GloVe vocabulary and model parameters are loaded once at construction. Each inference runs in its own temporary
+    folder, as LFTM writes its output next to the input corpus, so that concurrent requests never share files.
+
+    :param str paras_path: Path of the .paras file of the trained model
+    :param str name: Name of the model
+    """
+
+    def __init__(self, paras_path, name='LFLDA'):
+        self.paras_path = paras_path
+        self.name = name
+        self.log = logging.getLogger(self.__class__.__name__)
+
+        self.params = {}
+        with open(paras_path, "r") as f:
+            for line in f.readlines():
+                k, v = line.strip().split('\t')
+                self.params[k[1:]] = v
+
+        self.glove = get_glove(GLOVE_TXT)
+
+    def infer(self, texts, initer=500, niter=0, twords=10):
+        """Infer the topic distribution of documents with a single run of LFTM.
+
+            :param list texts: The documents, tokens space separated
+            :param int initer: initial sampling iterations
+            :param int niter: sampling iterations for the latent feature topic models
+            :param int twords: number of topical words written by LFTM
+            :returns: a D x K matrix, where each row is the topic distribution of a document. The documents without
+                any word in the GloVe vocabulary, which LFTM would drop, get the uniform distribution
+        """
+        docs = []
+        for text in texts:
+            words = text.split()
+            docs.append(' '.join([w for w, known in zip(words, self.glove.contains(words)) if known]))
+        # LFTM writes no topic distribution for the empty documents
+        rows = [i for i, doc in enumerate(docs) if doc]
+
+        num_topics = int(self.params['ntopics'])
+        theta = np.full((len(docs), num_topics), 1 / num_topics)
+        if not rows:
+            return theta
+
+        with tempfile.TemporaryDirectory(prefix='lftm') as folder:
+            doc_path = os.path.join(folder, 'doc.txt')
+            with open(doc_path, "w", encoding='utf-8') as f:
+                for i in rows:
+                    f.write(docs[i] + '\n')
+
+            proc = f'java -jar {LFTM_JAR} -model {self.params["model"]}inf -paras {self.paras_path} ' \
+                   f'-corpus {doc_path} -initers {initer} -niters {niter} -twords {twords} -name {self.name}inf ' \
+                   f'-sstep 0'
+            self.log.debug('Executing: ' + proc)
+
+            logWrap = LoggerWrapper(self.log)
+            completed_proc = subprocess.run(proc, shell=True, stderr=logWrap, stdout=logWrap)
+            self.log.debug(f'Completed with code {completed_proc.returncode}')
+            if completed_proc.returncode != 0:
+                raise RuntimeError(f'LFTM inference failed with code {completed_proc.returncode}')
+
+            with open(os.path.join(folder, '%sinf.theta' % self.name), "r") as file:
+                inferred = [line.split() for line in file if line.strip()]
+
+        if len(inferred) != len(rows):
+            raise RuntimeError(f'LFTM returned {len(inferred)} topic distributions for {len(rows)} documents')
+        theta[rows] = np.array(inferred, dtype=np.float64).reshape(len(rows), num_topics)
+        return theta
+
+
 # Latent Feature Topic Model
 class LftmModel(AbstractModel):
     """Latent Feature Topic Model
@@ -51,7 +126,7 @@ class LftmModel(AbstractModel):
         """LFTM Model constructor
 
         :param model_path: Path of the computed model
-        :param data_root: Path of output files, regenerated at each prediction
+        :param data_root: Unused, the inference files are written in temporary folders. Kept for compatibility
         :param name: Name of the model
         """
         super().__init__(model_path)
@@ -60,15 +135,12 @@ class LftmModel(AbstractModel):
         self.paras_path = None
         self.theta_path_model = None
         self.data_glove = None
+        self.session = None
+        self._session_lock = threading.Lock()
 
         self.update_model_path(model_path, name)
 
-        data_root = os.path.abspath(data_root)
-        self.doc_path = data_root + '/doc.txt'
-        self.theta_path = data_root + '/%sinf.theta' % name
-
         self.name = name
-        os.makedirs(data_root, exist_ok=True)
         os.makedirs(model_path, exist_ok=True)
 
         if not os.path.isfile(GLOVE_TXT):
@@ -81,11 +153,25 @@ class LftmModel(AbstractModel):
         self.paras_path = model_root + '/%s.paras' % name
         self.theta_path_model = model_root + '/%s.theta' % name
         self.data_glove = model_root + '/%s.glove' % name
+        self.session = None
+
+    def get_session(self):
+        """The inference session of the model, created at the first call"""
+        with self._session_lock:
+            if self.session is None:
+                self.session = LftmInferenceSession(self.paras_path, self.name)
+            return self.session
+
+    def load(self, path=None):
+        # the parameters of the inference session are read from the model files
+        if path is not None:
+            self.update_model_path(path, self.name)
+        self.session = None
 
     def save(self, path=None):
         if path is not None and path != self.model_path:
             shutil.move(self.model_path, path)
-            self.model_path = path
+            self.update_model_path(path, self.name)
 
     def train(self,
               data=AbstractModel.ROOT + '/data/test.txt',
@@ -100,7 +186,7 @@ class LftmModel(AbstractModel):
               model='LFLDA'):
         """ Train LFTM model.
 
-            :param data: The path of the training corpus
+            :param data: The training corpus as path, list of strings or TokenizedCorpus
             :param int num_topics: The desired number of topics
             :param bool preprocessing: If true, apply preprocessing to the corpus
             :param float alpha: Prior document-topic distribution
@@ -114,18 +200,10 @@ class LftmModel(AbstractModel):
         if model not in ['LFLDA', 'LFDMM']:
             raise ValueError('Model should be LFLDA (default) or LFDMM.')
 
-        with open(GLOVE_TOKENS, "rb") as input_file:
-            glovetokens = pickle.load(input_file)
-
         text = input_to_list_string(data, preprocessing)
-        tokens = [doc.split() for doc in text]
-
-        id2word = list(gensim.corpora.Dictionary(tokens).values())
+        id2word = list(corpus_artifacts(data, preprocessing).dictionary.values())
 
-        tok2remove = {}
-        for t in id2word:
-            if t not in glovetokens:
-                tok2remove[t] = True
+        tok2remove = {t: True for t, known in zip(id2word, get_glove(GLOVE_TXT).contains(id2word)) if not known}
 
         text = [remove_tokens(doc, tok2remove) for doc in text]
 
@@ -142,6 +220,7 @@ class LftmModel(AbstractModel):
 
         completed_proc = subprocess.run(proc, shell=True, stdout=logWrap, stderr=logWrap)
         self.log.debug(f'Completed with code {completed_proc.returncode}')
+        self.session = None
 
         return 'success' if completed_proc.returncode == 0 else ('error %d' % completed_proc.returncode)
 
@@ -155,38 +234,25 @@ class LftmModel(AbstractModel):
             :param int initer: initial sampling iterations to separate the counts for the latent feature component and the Dirichlet multinomial component
             :param int niter: sampling iterations for the latent feature topic models
         """
-        with open(GLOVE_TOKENS, "rb") as input_file:
-            glovetokens = pickle.load(input_file)
-
-        if preprocessing:
-            preprocess(text)
-
-        params = {}
-        with open(self.paras_path, "r") as f:
-            for line in f.readlines():
-                k, v = line.strip().split('\t')
-                params[k[1:]] = v
-
-        text = ' '.join([word for word in text.split() if word in glovetokens])
-
-        with open(self.doc_path, "w", encoding='utf-8') as f:
-            f.write(text)
+        scores, top = self.predict_batch([text], topn=topn, preprocessing=preprocessing, initer=initer, niter=niter)
+        return to_predictions(scores, top)[0]
 
-        # Perform Inference
-        proc = f'java -jar {LFTM_JAR} -model {params["model"]}inf -paras {self.paras_path} -corpus {self.doc_path} ' \
-               f'-initers {initer} -niters {niter} -twords {topn} -name {self.name}inf -sstep 0'
-        self.log.debug('Executing: ' + proc)
+    def predict_batch(self, texts, topn=10, preprocessing=False, initer=500, niter=0):
+        """Predict the topics of many texts with a single LFTM run
 
-        logWrap = LoggerWrapper(self.log)
-        completed_proc = subprocess.run(proc, shell=True, stderr=logWrap, stdout=logWrap)
-        self.log.debug(f'Completed with code {completed_proc.returncode}')
-
-        with open(self.theta_path, "r") as file:
-            doc_topic_dist = file.readline()
+            :param list texts: The texts on which performing the prediction
+            :param int topn: Number of most probable topics to return
+            :param bool preprocessing: If True, execute preprocessing on the documents
+            :param int initer: initial sampling iterations to separate the counts for the latent feature component and the Dirichlet multinomial component
+            :param int niter: sampling iterations for the latent feature topic models
+            :returns: a D x K matrix of topic scores, and a D x topn matrix with the most probable topics
+        """
+        if preprocessing:
+            texts = list(preprocess_corpus(texts, workers=1))
 
-        doc_topic_dist = [(int(topic), float(weight)) for topic, weight in enumerate(doc_topic_dist.split())]
-        results = sorted(doc_topic_dist, key=lambda kv: kv[1], reverse=True)[:topn]
-        return results
+        scores = self.get_session().infer(texts, initer=initer, niter=niter, twords=topn)
+        top = np.argsort(-scores, axis=1, kind='stable')[:, :topn]
+        return scores, top
 
     def get_corpus_predictions(self, topn: int = 5):
         with open(self.theta_path_model, "r") as file:
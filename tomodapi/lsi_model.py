@@ -1,11 +1,8 @@
-from collections import defaultdict
-
-from gensim import corpora
 from gensim.models import LsiModel, TfidfModel
 
 from .abstract_model import AbstractModel
 from .gensim_model import GensimModel
-from .utils.corpus import preprocess, input_to_list_string
+from .utils.artifacts import corpus_artifacts
 
 
 class LSIModel(GensimModel):
@@ -29,7 +26,7 @@ class LSIModel(GensimModel):
               extra_samples=100):
         """
         Train the model and generate the results on the corpus
-            :param data: The training corpus as path or list of strings
+            :param data: The training corpus as path, list of strings or TokenizedCorpus
             :param int num_topics: The desired number of topics
             :param bool preprocessing: If true, apply preprocessing to the corpus
             :param bool use_tfidf: If true, use TF-iDF instead of word frequency
@@ -40,22 +37,8 @@ class LSIModel(GensimModel):
             :param int power_iters: Number of power iteration steps to be used. Increasing the number of power iterations improves accuracy, but lowers performance
             :param int extra_samples:  Extra samples to be used besides the rank k. Can improve accuracy.
         """
-        frequency = defaultdict(int)
-        data = input_to_list_string(data, preprocessing)
-        for text in data:
-            for token in text.split(' '):
-                frequency[token] += 1
-
-        if preprocessing:
-            data = map(preprocess, data)
-
-        texts = [
-            [token for token in text.split(' ') if frequency[token] > 1 and len(token) > 0]
-            for text in data
-        ]
-
-        dictionary = corpora.Dictionary(texts)
-        corpus = [dictionary.doc2bow(text) for text in texts]
+        # ignore the words appearing only once
+        dictionary, corpus = corpus_artifacts(data, preprocessing).view(min_cf=2)
 
         if use_tfidf:
             tfidf = TfidfModel(corpus)
@@ -67,6 +50,13 @@ class LSIModel(GensimModel):
 
         self.model = lsi_model
         self.dictionary = dictionary
-        self.corpus_predictions = lsi_model[corpus]
+        self.corpus_predictions = list(lsi_model[corpus])
 
         return 'success'
+
+    @property
+    def num_topics(self):
+        """Number of topics of the projection, which is lower than the requested one on low-rank corpora"""
+        if self.model is None:
+            self.load()
+        return self.model.projection.u.shape[1]
@@ -1,11 +1,8 @@
-from collections import defaultdict
-
-from gensim.corpora.dictionary import Dictionary
 from gensim.models.nmf import Nmf
 
 from .gensim_model import GensimModel
 from .abstract_model import AbstractModel
-from .utils.corpus import preprocess, input_to_list_string
+from .utils.artifacts import corpus_artifacts
 
 
 class NMFModel(GensimModel):
@@ -32,7 +29,7 @@ class NMFModel(GensimModel):
               random_state=None):
         """
         Train the model and generate the results on the corpus
-            :param data: The training corpus as path or list of strings
+            :param data: The training corpus as path, list of strings or TokenizedCorpus
             :param int num_topics: The desired number of topics
             :param bool preprocessing: If true, apply preprocessing to the corpus
             :param int passes: Number of full passes over the training corpus. Leave at default passes=1 if your input is an iterator.
@@ -47,22 +44,8 @@ class NMFModel(GensimModel):
             :param int random_state: Seed for random generator. Needed for reproducibility.
 
         """
-        frequency = defaultdict(int)
-        data = input_to_list_string(data, preprocessing)
-        for text in data:
-            for token in text.split(' '):
-                frequency[token] += 1
-
-        if preprocessing:
-            data = map(preprocess, data)
-
-        texts = [
-            [token for token in text.split(' ') if frequency[token] > 1 and len(token) > 0]
-            for text in data
-        ]
-
-        dictionary = Dictionary(texts)
-        corpus = [dictionary.doc2bow(text) for text in texts]
+        # ignore the words appearing only once
+        dictionary, corpus = corpus_artifacts(data, preprocessing).view(min_cf=2)
 
         nmf_model = Nmf(corpus,
                         id2word=dictionary,
@@ -79,6 +62,6 @@ class NMFModel(GensimModel):
 
         self.model = nmf_model
         self.dictionary = dictionary
-        self.corpus_predictions = nmf_model[corpus]
+        self.corpus_predictions = list(nmf_model[corpus])
 
         return 'success'
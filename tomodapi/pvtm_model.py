@@ -4,7 +4,8 @@ import numpy as np
 from pvtm import pvtm
 
 from .abstract_model import AbstractModel
-from .utils.corpus import preprocess, input_to_list_string
+from .utils.corpus import preprocess_corpus, input_to_list_string
+from .utils.prediction import to_predictions
 
 
 class PvtmModel(AbstractModel):
@@ -35,7 +36,7 @@ class PvtmModel(AbstractModel):
               covariance_type='diag'):
         """Train LDA model.
 
-            :param data: The training corpus as path or list of strings
+            :param data: The training corpus as path, list of strings or TokenizedCorpus
             :param int num_topics: The desired number of topics
             :param bool preprocessing: If true, apply preprocessing to the corpus
             :param int vector_size: dimensionality of the feature vectors (Doc2Vec)
@@ -77,18 +78,27 @@ class PvtmModel(AbstractModel):
             :param int topn: Number of most probable topics to return
             :param bool preprocess: If True, execute preprocessing on the document
         """
+        scores, top = self.predict_batch([text], topn=topn, preprocessing=preprocessing)
+        return to_predictions(scores, top)[0]
 
+    def predict_batch(self, texts, topn=5, preprocessing=False):
+        """Predict the topics of many texts, with a single GMM prediction over their inferred vectors
+
+            :param list texts: The texts on which performing the prediction
+            :param int topn: Number of most probable topics to return
+            :param bool preprocessing: If True, execute preprocessing on the documents
+            :returns: a D x K matrix of topic scores, and a D x topn matrix with the most probable topics
+        """
         if self.model is None:
             self.load()
 
         if preprocessing:
-            text = preprocess(text)
-
-        # print(self.model.get_document_topics())
-        results = [(topic, score) for topic, score in enumerate(self.model.infer_topics(text, probabilities=True)[0])]
-        results = sorted(results, key=lambda kv: kv[1], reverse=True)[:topn]
+            texts = list(preprocess_corpus(texts, workers=1))
 
-        return results
+        vectors = np.array([self.model.model.infer_vector(text.split()) for text in texts])
+        scores = self.model.get_topic_weights(vectors, probabilities=True)
+        top = np.argsort(-scores, axis=1, kind='stable')[:, :topn]
+        return scores, top
 
     @property
     def topics(self):
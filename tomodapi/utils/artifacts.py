@@ -0,0 +1,221 @@
+import os
+import copy
+import shutil
+import tempfile
+from array import array
+
+import numpy as np
+import scipy.sparse
+from gensim.corpora import Dictionary
+from gensim.matutils import Sparse2Corpus
+
+from .cache import CorpusCache, CACHE_DIR
+from .corpus import corpus_fingerprint, input_to_corpus
+
+DICTIONARY_FILE = 'dictionary.pkl'
+BOW_FILES = ['data', 'indices', 'indptr']
+# sub-folder of the pruned artifacts, by min_cf and remove_n_most_frequent
+VIEW_FOLDER = 'view_%d_%d'
+# documents of the BoW matrix read at a time while pruning
+VIEW_BLOCK = 10000
+
+
+class CorpusArtifacts:
+    """ Dictionary and BoW corpus computed on a corpus.
+
+    The BoW is stored as a CSR matrix (documents x words), each component in a .npy file which is memory-mapped
+    at loading. Pruned versions of the dictionary and of the BoW are obtained with `view`.
+
+    :param str path: Folder of the artifacts
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.dictionary = Dictionary.load(os.path.join(path, DICTIONARY_FILE))
+
+        data, indices, indptr = [np.load(os.path.join(path, 'bow_%s.npy' % x), mmap_mode='r') for x in BOW_FILES]
+        self.bow_matrix = scipy.sparse.csr_matrix((data, indices, indptr),
+                                                  shape=(len(indptr) - 1, len(self.dictionary)), copy=False)
+
+    @staticmethod
+    def build(corpus, path):
+        """ Compute the artifacts of a corpus.
+
+        :param corpus: Restartable corpus, as returned by `input_to_corpus`
+        :param str path: Folder where to write the artifacts
+        """
+        dictionary = Dictionary(corpus.tokens())
+
+        indptr = array('q', [0])
+        indices = array('i')
+        data = array('i')
+        for tokens in corpus.tokens():
+            bow = dictionary.doc2bow(tokens)
+            indices.extend(word_id for word_id, _ in bow)
+            data.extend(count for _, count in bow)
+            indptr.append(len(indices))
+
+        # same dtype for indices and indptr, so that scipy does not copy them when loading
+        index_dtype = np.int32 if len(indices) < np.iinfo(np.int32).max else np.int64
+
+        os.makedirs(path, exist_ok=True)
+        dictionary.save(os.path.join(path, DICTIONARY_FILE))
+        np.save(os.path.join(path, 'bow_data.npy'), np.frombuffer(data, dtype=np.int32))
+        np.save(os.path.join(path, 'bow_indices.npy'), np.frombuffer(indices, dtype=np.int32).astype(index_dtype))
+        np.save(os.path.join(path, 'bow_indptr.npy'), np.frombuffer(indptr, dtype=np.int64).astype(index_dtype))
+
+    @property
+    def bow(self):
+        """The BoW corpus, as a restartable iterable of gensim BoW vectors"""
+        return Sparse2Corpus(self.bow_matrix, documents_columns=False)
+
+    def view(self, min_cf=None, remove_n_most_frequent=None):
+        """ Prune the vocabulary, without re-reading the corpus.
+
+        The pruned artifacts are computed once by streaming the BoW matrix by blocks of documents, then stored in a
+        sub-folder of the artifacts, named after the pruning parameters, and memory-mapped as the original ones.
+
+        :param int min_cf: Remove the words which appear less than `min_cf` times in the corpus
+        :param int remove_n_most_frequent: Remove the n words which appear in more documents
+        :returns: the pruned dictionary and the corresponding BoW corpus
+        """
+        if not min_cf and not remove_n_most_frequent:
+            return self.dictionary, self.bow
+
+        path = os.path.join(self.path, VIEW_FOLDER % (min_cf or 0, remove_n_most_frequent or 0))
+        if not os.path.isdir(path):
+            tmp = tempfile.mkdtemp(dir=self.path, suffix='.tmp')
+            self._build_view(tmp, min_cf, remove_n_most_frequent)
+            try:
+                os.rename(tmp, path)
+            except OSError:
+                # computed in the meanwhile by another process
+                shutil.rmtree(tmp)
+
+        view = CorpusArtifacts(path)
+        return view.dictionary, view.bow
+
+    def _build_view(self, path, min_cf, remove_n_most_frequent):
+        dictionary = copy.deepcopy(self.dictionary)
+        if min_cf:
+            dictionary.filter_tokens(bad_ids=[i for i, freq in dictionary.cfs.items() if freq < min_cf])
+        if remove_n_most_frequent:
+            dictionary.filter_n_most_frequent(remove_n_most_frequent)
+
+        # the new id of each word of the original dictionary, -1 for the removed ones
+        new_ids = np.full(len(self.dictionary), -1, dtype=np.int64)
+        for token, new_id in dictionary.token2id.items():
+            new_ids[self.dictionary.token2id[token]] = new_id
+
+        matrix = self.bow_matrix
+        blocks = range(0, matrix.shape[0], VIEW_BLOCK)
+
+        # first pass: the number of kept words of each document
+        counts = np.zeros(matrix.shape[0], dtype=np.int64)
+        for start in blocks:
+            block = matrix[start:start + VIEW_BLOCK]
+            rows = np.repeat(np.arange(block.shape[0]), np.diff(block.indptr))
+            counts[start:start + block.shape[0]] = np.bincount(rows[new_ids[block.indices] >= 0],
+                                                               minlength=block.shape[0])
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+
+        index_dtype = np.int32 if indptr[-1] < np.iinfo(np.int32).max else np.int64
+        dictionary.save(os.path.join(path, DICTIONARY_FILE))
+        np.save(os.path.join(path, 'bow_indptr.npy'), indptr.astype(index_dtype))
+        data = np.lib.format.open_memmap(os.path.join(path, 'bow_data.npy'), mode='w+', dtype=np.int32,
+                                         shape=(int(indptr[-1]),))
+        indices = np.lib.format.open_memmap(os.path.join(path, 'bow_indices.npy'), mode='w+', dtype=index_dtype,
+                                            shape=(int(indptr[-1]),))
+
+        # second pass: the kept words, renumbered, written in place
+        for start in blocks:
+            block = matrix[start:start + VIEW_BLOCK]
+            ids = new_ids[block.indices]
+            kept = ids >= 0
+            begin, end = indptr[start], indptr[min(start + VIEW_BLOCK, matrix.shape[0])]
+            data[begin:end] = block.data[kept]
+            indices[begin:end] = ids[kept]
+        data.flush()
+        indices.flush()
+
+
+class ArtifactCache(CorpusCache):
+    """On-disk cache of artifacts computed on a corpus, addressed by the corpus fingerprint.
+
+    :param str path: Folder of the cache
+    :param int max_size: Maximum size of the cache in bytes
+    :param artifact_class: Class of the artifacts, with a `build(corpus, path)` static method and a constructor
+        taking the folder of the artifacts
+    """
+
+    def __init__(self, path=os.path.join(CACHE_DIR, 'artifacts'), max_size=4 * 1024 ** 3,
+                 artifact_class=CorpusArtifacts):
+        super().__init__(path, max_size)
+        self.artifact_class = artifact_class
+
+    def _file(self, key):
+        return os.path.join(self.path, key)
+
+    def __contains__(self, key):
+        return os.path.isdir(self._file(key))
+
+    def file(self, key):
+        folder = self._file(key)
+        if not os.path.isdir(folder):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        os.utime(folder)
+        with self._lock:
+            self.hits += 1
+        return folder
+
+    def get(self, key):
+        """Return the cached artifacts for `key`, or None if they are not in cache."""
+        folder = self.file(key)
+        return None if folder is None else self.artifact_class(folder)
+
+    def put(self, key, corpus):
+        """Compute and store the artifacts of `corpus` under `key`. Returns the artifacts."""
+        os.makedirs(self.path, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=self.path, suffix='.tmp')
+        self.artifact_class.build(corpus, tmp)
+        try:
+            os.rename(tmp, self._file(key))
+        except OSError:
+            # computed in the meanwhile by another process
+            shutil.rmtree(tmp)
+
+        self.evict(keep=key)
+        return self.artifact_class(self._file(key))
+
+    def _entries(self):
+        for name in os.listdir(self.path):
+            folder = os.path.join(self.path, name)
+            if name.endswith('.tmp') or not os.path.isdir(folder):
+                continue
+            # including the pruned views in the sub-folders
+            size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(folder) for f in files)
+            yield os.stat(folder).st_mtime, size, name
+
+    def _remove(self, key):
+        shutil.rmtree(self._file(key), ignore_errors=True)
+
+
+artifact_cache = ArtifactCache()
+
+
+def corpus_artifacts(data, preprocessing=False, workers=None):
+    """ Dictionary and BoW of the corpus, computed once and cached by corpus fingerprint.
+
+    :param data: The corpus as path, list of strings or TokenizedCorpus
+    :param bool preprocessing: If true, apply preprocessing to the corpus
+    :param int workers: Number of processes used for preprocessing
+    :returns: the CorpusArtifacts
+    """
+    key = corpus_fingerprint(data, preprocessing)
+    artifacts = artifact_cache.get(key)
+    if artifacts is None:
+        artifacts = artifact_cache.put(key, input_to_corpus(data, preprocessing, workers))
+    return artifacts
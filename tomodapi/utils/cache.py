@@ -0,0 +1,142 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+CACHE_DIR = os.getenv('TOMODAPI_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'tomodapi'))
+
+
+def read_lines(path):
+    with open(path, "r", encoding='utf-8') as datafile:
+        for line in datafile:
+            yield line.rstrip()
+
+
+def fingerprint(lines, **settings):
+    """ Content hash of a corpus.
+
+    :param lines: The corpus as iterable of strings
+    :param settings: Any setting that changes what is derived from the corpus (e.g. preprocessing options)
+    :returns: an hexadecimal digest
+    """
+    h = hashlib.sha1(json.dumps(settings, sort_keys=True).encode('utf-8'))
+    for line in lines:
+        h.update(line.encode('utf-8'))
+        h.update(b'\n')
+    return h.hexdigest()
+
+
+def array_fingerprint(arrays, **settings):
+    """ Content hash of a corpus stored as numpy arrays, hashing their buffers directly.
+
+    :param arrays: The arrays of the corpus, possibly memory-mapped
+    :param settings: Any setting that changes what is derived from the corpus (e.g. preprocessing options)
+    :returns: an hexadecimal digest
+    """
+    h = hashlib.sha1(json.dumps(dict(settings, format='arrays'), sort_keys=True).encode('utf-8'))
+    for array in arrays:
+        h.update(f'{array.dtype.str}{array.shape}'.encode('utf-8'))
+        h.update(memoryview(array).cast('B') if array.flags.c_contiguous else array.tobytes())
+    return h.hexdigest()
+
+
+class CorpusCache:
+    """On-disk cache of corpora, one document per line, addressed by their fingerprint.
+
+    The least recently used entries are evicted when the total size exceeds `max_size`.
+
+    :param str path: Folder of the cache
+    :param int max_size: Maximum size of the cache in bytes
+    """
+
+    def __init__(self, path=os.path.join(CACHE_DIR, 'corpora'), max_size=2 * 1024 ** 3):
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.txt')
+
+    def __contains__(self, key):
+        return os.path.isfile(self._file(key))
+
+    def get(self, key):
+        """Return the cached lines for `key`, or None if they are not in cache."""
+        file = self.file(key)
+        if file is None:
+            return None
+
+        return list(read_lines(file))
+
+    def file(self, key):
+        """Return the path of the cached file for `key`, or None if it is not in cache."""
+        file = self._file(key)
+        if not os.path.isfile(file):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        os.utime(file)
+        with self._lock:
+            self.hits += 1
+        return file
+
+    def put(self, key, lines):
+        """Store `lines` under `key` and evict old entries if needed. Returns the path of the cached file.
+
+        :param key: The key of the entry
+        :param lines: Iterable of strings, which is consumed while writing
+        """
+        os.makedirs(self.path, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            # every line ends with a newline, so that a final empty document is kept by `read_lines`
+            for line in lines:
+                f.write(line + '\n')
+        os.replace(tmp, self._file(key))
+
+        self.evict(keep=key)
+        return self._file(key)
+
+    def evict(self, keep=None):
+        """Remove the least recently used entries until the cache fits in `max_size`.
+
+        :param str keep: Key of an entry which should never be evicted
+        """
+        entries = list(self._entries())
+        size = sum(e[1] for e in entries)
+
+        for _, entry_size, key in sorted(entries):
+            if size <= self.max_size:
+                break
+            if key == keep:
+                continue
+            self._remove(key)
+            size -= entry_size
+
+    def _entries(self):
+        """Iterate on the cache entries as (last access time, size, key)"""
+        for name in os.listdir(self.path):
+            if name.endswith('.txt'):
+                stat = os.stat(os.path.join(self.path, name))
+                yield stat.st_mtime, stat.st_size, name[:-len('.txt')]
+
+    def _remove(self, key):
+        try:
+            os.remove(self._file(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        if os.path.isdir(self.path):
+            for _, _, key in list(self._entries()):
+                self._remove(key)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+corpus_cache = CorpusCache()
@@ -0,0 +1,353 @@
+import os
+import threading
+import multiprocessing
+from array import array
+from functools import partial
+
+import numpy as np
+
+from .artifacts import ArtifactCache
+from .cache import CACHE_DIR
+from .corpus import corpus_fingerprint, read_lines
+
+# as in gensim's CoherenceModel
+EPSILON = 1e-12
+TOPN = 20
+WINDOW_SIZES = {'c_v': 110, 'c_npmi': 10, 'c_uci': 10, 'u_mass': None}
+
+# minimum number of topics for computing the coherences in a pool of processes
+POOL_MIN_TOPICS = 50
+
+REFERENCE_FILES = ['vocabulary.npy', 'tokens.npy', 'offsets.npy', 'postings.npy', 'postings_indptr.npy', 'df.npy']
+
+
+def word_embedding_coherence(topic_sets, glove):
+    """ Word embedding coherence (c_we) of many sets of topics at once.
+
+    The coherence of a topic is the average cosine similarity between the embeddings of its words, over all the
+    pairs of distinct words in the embedding vocabulary. The vectors of all the topics are gathered and normalized
+    once, then the similarities of all the pairs are computed with a single batched product.
+
+    :param topic_sets: list of topic sets, e.g. the topics of several models, each one a list of topics as lists
+        of words
+    :param glove: The GloveStore of the embeddings
+    :returns: a list with an array of per-topic coherences for each topic set. Topics without any valid pair get 0
+    """
+    topics = [list(topic) for topic_set in topic_sets for topic in topic_set]
+    n_words = max([len(topic) for topic in topics], default=0)
+
+    # rows of the topic words in the embedding matrix, -1 for padding and unknown words
+    rows = np.full((len(topics), n_words), -1, dtype=np.int64)
+    words = np.full((len(topics), n_words), None, dtype=object)
+    for i, topic in enumerate(topics):
+        rows[i, :len(topic)] = glove.index(topic)
+        words[i, :len(topic)] = topic
+    known = rows >= 0
+
+    vectors = np.zeros(rows.shape + (glove.vectors.shape[1],), dtype=np.float64)
+    vectors[known] = glove.vectors[rows[known]] / glove.norms[rows[known]][:, None]
+    similarities = np.einsum('tid,tjd->tij', vectors, vectors)
+
+    pairs = known[:, :, None] & known[:, None, :] & (words[:, :, None] != words[:, None, :])
+    counts = pairs.sum(axis=(1, 2))
+    scores = np.where(pairs, similarities, 0).sum(axis=(1, 2))
+    scores = np.divide(scores, counts, out=np.zeros(len(topics)), where=counts > 0)
+
+    results = []
+    start = 0
+    for topic_set in topic_sets:
+        results.append(scores[start:start + len(topic_set)])
+        start += len(topic_set)
+    return results
+
+
+class ReferenceIndex:
+    """ Positional index of a reference corpus, for the coherence metrics based on word (co-)occurrences.
+
+    The corpus is stored as:
+    - the vocabulary, as a sorted array of utf-8 encoded words, the id of a word being its position;
+    - the token ids of all the documents concatenated, with the offset of each document;
+    - the postings, i.e. the positions of the tokens sorted by word, with the offset of each word;
+    - the document frequency of each word.
+
+    The arrays are stored as .npy files and memory-mapped at loading. The document and sliding window counts of
+    any set of words are computed from their postings only, without reading the corpus again.
+
+    :param str path: Folder of the index
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.vocabulary, self.tokens, self.offsets, self.postings, self.postings_indptr, self.df = \
+            [np.load(os.path.join(path, f), mmap_mode='r') for f in REFERENCE_FILES]
+
+    @staticmethod
+    def build(texts, path):
+        """ Index a corpus.
+
+        :param texts: The corpus as iterable of lists of tokens
+        :param str path: Folder where to write the index
+        """
+        word2id = {}
+        tokens = array('i')
+        offsets = array('q', [0])
+        for text in texts:
+            tokens.extend(word2id.setdefault(w, len(word2id)) for w in text)
+            offsets.append(len(tokens))
+
+        # ids in the order of the sorted vocabulary
+        words = np.array([w.encode('utf-8') for w in word2id]) if word2id else np.zeros(0, dtype='S1')
+        order = np.argsort(words, kind='stable')
+        rank = np.empty(len(order), dtype=np.int32)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+        tokens = rank[np.frombuffer(tokens, dtype=np.int32)]
+        offsets = np.frombuffer(offsets, dtype=np.int64)
+
+        postings = np.argsort(tokens, kind='stable').astype(np.int64)
+        postings_indptr = np.zeros(len(words) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tokens, minlength=len(words)), out=postings_indptr[1:])
+
+        # documents of the tokens, counted once per word
+        docs = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        first = np.ones(len(tokens), dtype=bool)
+        sorted_docs = docs[postings]
+        first[1:] = (sorted_docs[1:] != sorted_docs[:-1]) | (tokens[postings][1:] != tokens[postings][:-1])
+        df = np.bincount(tokens[postings][first], minlength=len(words)).astype(np.int32)
+
+        os.makedirs(path, exist_ok=True)
+        for f, a in zip(REFERENCE_FILES, [words[order], tokens, offsets, postings, postings_indptr, df]):
+            np.save(os.path.join(path, f), a)
+
+    @property
+    def num_docs(self):
+        return len(self.offsets) - 1
+
+    def ids(self, words):
+        """ Ids of words in the vocabulary of the corpus.
+
+        :param words: list of words
+        :returns: an array with the id of each word, -1 for the words which are not in the corpus
+        """
+        encoded = [w.encode('utf-8') for w in words]
+        if len(encoded) == 0 or len(self.vocabulary) == 0:
+            return np.full(len(encoded), -1, dtype=np.int64)
+        keys = np.array(encoded, dtype=self.vocabulary.dtype)
+        pos = np.minimum(np.searchsorted(self.vocabulary, keys), len(self.vocabulary) - 1)
+        found = self.vocabulary[pos] == keys
+        # the words longer than any word of the vocabulary are truncated by the cast
+        found &= np.array([len(w) <= self.vocabulary.itemsize for w in encoded])
+        return np.where(found, pos, -1).astype(np.int64)
+
+    def positions(self, word_id):
+        """Positions of the occurrences of a word in the concatenated corpus, in increasing order"""
+        return self.postings[self.postings_indptr[word_id]:self.postings_indptr[word_id + 1]]
+
+    def documents(self, word_id):
+        """Documents containing a word, in increasing order"""
+        return np.unique(np.searchsorted(self.offsets, self.positions(word_id), side='right') - 1)
+
+    def windows(self, word_ids, window_size):
+        """ Sliding windows containing each word, among the documents containing at least one of the words.
+
+        The windows are counted like gensim does: a document shorter than the window is a single window, and the
+        presence of a word is updated only with the tokens entering and leaving the window. As a consequence, a word
+        leaving a window is considered absent until it enters again, even if it occurs elsewhere in the window.
+
+        :param word_ids: list of word ids
+        :param int window_size: Size of the sliding window
+        :returns: the total number of windows, and for each word the windows containing it as a pair of arrays
+            (starts, ends) of disjoint intervals in increasing order
+        """
+        positions = [np.asarray(self.positions(w)) for w in word_ids]
+        docs = [np.searchsorted(self.offsets, p, side='right') - 1 for p in positions]
+
+        relevant = np.unique(np.concatenate(docs)) if docs else np.zeros(0, dtype=np.int64)
+        lengths = self.offsets[relevant + 1] - self.offsets[relevant]
+        num_windows = np.maximum(lengths - window_size + 1, 1)
+        window_offsets = np.concatenate([[0], np.cumsum(num_windows)])
+
+        intervals = []
+        for p, d in zip(positions, docs):
+            rank = np.searchsorted(relevant, d)
+            start = np.maximum(p - self.offsets[d] - window_size + 1, 0)
+            # the word leaves the window after the first of its occurrences in it
+            first = p[np.searchsorted(p, self.offsets[d] + start)] - self.offsets[d]
+            end = np.minimum(first + 1, num_windows[rank])
+            start, end = start + window_offsets[rank], end + window_offsets[rank]
+
+            # starts and ends are increasing, so overlapping intervals are consecutive
+            new = np.ones(len(start), dtype=bool)
+            new[1:] = start[1:] > end[:-1]
+            last = np.append(new[1:], True)
+            intervals.append((start[new], end[last]))
+        return int(window_offsets[-1]), intervals
+
+
+def _intersection(a, b):
+    """Size of the intersection of two unions of disjoint intervals, given as (starts, ends) in increasing order"""
+    starts, ends = b
+    cumulative = np.concatenate([[0], np.cumsum(ends - starts)])
+
+    def covered(x):
+        # size of b in [0, x)
+        k = np.searchsorted(starts, x, side='left')
+        return cumulative[k] - np.maximum(ends[np.maximum(k - 1, 0)] - x, 0) * (k > 0)
+
+    return int((covered(a[1]) - covered(a[0])).sum())
+
+
+class OccurrenceStatistics:
+    """ Documents or sliding windows of the reference corpus containing each word of a set.
+
+    The documents or windows of a word are kept as a union of disjoint intervals, so that the counts of any pair of
+    words are obtained by intersecting their intervals.
+
+    :param ReferenceIndex index: The reference corpus
+    :param word_ids: list of distinct word ids
+    :param int window_size: Size of the sliding window. If None, the documents are counted
+    """
+
+    def __init__(self, index, word_ids, window_size=None):
+        self.word_ids = np.asarray(word_ids, dtype=np.int64)
+        if window_size is None:
+            self.num_docs = index.num_docs
+            self.intervals = [(docs, docs + 1) for docs in (index.documents(w) for w in self.word_ids)]
+        else:
+            self.num_docs, self.intervals = index.windows(self.word_ids, window_size)
+
+    def counts(self, word_ids):
+        """ Occurrence counts of words, alone and in pairs.
+
+        :param word_ids: list of distinct word ids, among the ones of the statistics
+        :returns: a symmetric matrix of the counts of each pair of words, with the counts of the single words on the
+            diagonal
+        """
+        rows = np.searchsorted(self.word_ids, word_ids)
+        counts = np.zeros((len(rows), len(rows)), dtype=np.float64)
+        for i in range(len(rows)):
+            for j in range(i + 1):
+                counts[i, j] = counts[j, i] = _intersection(self.intervals[rows[i]], self.intervals[rows[j]])
+        return counts
+
+
+def _npmi(counts, num_docs, normalize=True):
+    probs = counts / num_docs
+    diagonal = np.diag(probs)
+    with np.errstate(divide='ignore'):
+        ratio = np.log((probs + EPSILON) / np.outer(diagonal, diagonal))
+    return ratio / -np.log(probs + EPSILON) if normalize else ratio
+
+
+def topic_coherence(counts, num_docs, metric):
+    """ Coherence of a topic from the occurrence counts of its words.
+
+    The metrics are the ones of gensim's CoherenceModel (Röder et al., 2015).
+
+    :param counts: Matrix of the counts of the pairs of topic words, as returned by `OccurrenceStatistics.counts`
+    :param int num_docs: Number of documents or windows of the reference corpus
+    :param str metric: Metric among <c_v, c_npmi, c_uci, u_mass>
+    :returns: the coherence, nan if the topic has less than two words
+    """
+    n = len(counts)
+    if n < 2 and metric != 'c_v':
+        return np.nan
+
+    if metric == 'u_mass':
+        # each word given the preceding ones
+        i, j = np.tril_indices(n, -1)
+        return np.mean(np.log((counts[i, j] / num_docs + EPSILON) / (counts[j, j] / num_docs)))
+
+    if metric == 'c_v':
+        # cosine between the NPMI vector of each word and the one of the whole topic
+        vectors = _npmi(counts, num_docs)
+        topic = vectors.sum(axis=0)
+        return np.mean(vectors @ topic / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(topic)))
+
+    pairs = ~np.eye(n, dtype=bool)
+    return np.mean(_npmi(counts, num_docs, normalize=metric == 'c_npmi')[pairs])
+
+
+def _statistics_key(metric):
+    # type of window, and minimum size of the topics whose words take part in the counts: as in gensim, the metrics
+    # averaging over pairs of words ignore the single word topics
+    return WINDOW_SIZES[metric], 1 if metric == 'c_v' else 2
+
+
+def _init_statistics(statistics):
+    global _statistics
+    _statistics = statistics
+
+
+def _topic_coherences(topic_ids, metrics, statistics=None):
+    """Coherences of a topic for each metric. If `statistics` is None, the ones of the pool worker are used."""
+    statistics = _statistics if statistics is None else statistics
+    results = {}
+    counts = {}
+    for metric in metrics:
+        key = _statistics_key(metric)
+        if len(topic_ids) < key[1]:
+            results[metric] = np.nan
+            continue
+        if key not in counts:
+            counts[key] = statistics[key].counts(topic_ids)
+        results[metric] = topic_coherence(counts[key], statistics[key].num_docs, metric)
+    return results
+
+
+def reference_coherence(topics, index, metrics=('c_v',), topn=TOPN, workers=None):
+    """ Coherence of topics against a reference corpus, for several metrics at once.
+
+    The words which are not in the corpus are removed from the topics, then only the first `topn` words are kept.
+    The statistics of the corpus are computed once for each type of window, and shared by all the metrics using it.
+    With at least POOL_MIN_TOPICS topics, the topics are distributed to a pool of processes.
+
+    :param topics: list of topics, each one as list of words
+    :param ReferenceIndex index: The reference corpus
+    :param metrics: list of metrics among <c_v, c_npmi, c_uci, u_mass>
+    :param int topn: Number of words of each topic to consider
+    :param int workers: Number of processes. If None, use all the available cores. If 1, run in the current process
+    :returns: a dict with the array of per-topic coherences of each metric
+    """
+    topic_ids = []
+    for topic in topics:
+        ids = index.ids(list(topic))
+        topic_ids.append(ids[ids >= 0][:topn])
+
+    statistics = {}
+    for window_size, min_words in set(_statistics_key(metric) for metric in metrics):
+        word_ids = np.unique(np.concatenate([ids for ids in topic_ids if len(ids) >= min_words] + [[]]))
+        statistics[window_size, min_words] = OccurrenceStatistics(index, word_ids.astype(np.int64), window_size)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(topic_ids) < POOL_MIN_TOPICS:
+        results = [_topic_coherences(ids, metrics, statistics) for ids in topic_ids]
+    else:
+        with multiprocessing.Pool(workers, initializer=_init_statistics, initargs=(statistics,)) as pool:
+            results = pool.map(partial(_topic_coherences, metrics=metrics), topic_ids)
+
+    return {metric: np.array([r[metric] for r in results], dtype=np.float64) for metric in metrics}
+
+
+reference_cache = ArtifactCache(os.path.join(CACHE_DIR, 'references'), artifact_class=ReferenceIndex)
+_indexes = {}
+_indexes_lock = threading.Lock()
+_statistics = None
+
+
+def reference_index(datapath):
+    """ The ReferenceIndex of a corpus file, built once and cached on disk by corpus fingerprint.
+
+    The index is also kept in memory for the whole process, as long as the file is not modified.
+
+    :param str datapath: Path of the corpus, one document per line, tokens space separated
+    """
+    stat = os.stat(datapath)
+    key = (os.path.abspath(datapath), stat.st_mtime, stat.st_size)
+    with _indexes_lock:
+        if key not in _indexes:
+            fingerprint = corpus_fingerprint(datapath)
+            index = reference_cache.get(fingerprint)
+            if index is None:
+                index = reference_cache.put(fingerprint, (line.split() for line in read_lines(datapath)))
+            _indexes[key] = index
+        return _indexes[key]
@@ -1,34 +1,232 @@
+import os
 import re
-import nltk
-from nltk import pos_tag
+import threading
+import multiprocessing
+from functools import lru_cache, partial
 
+from .cache import corpus_cache, fingerprint, array_fingerprint, read_lines
+from .tokenized import TokenizedCorpus, is_tokenized_corpus
 
-init_done = False
+# NLTK is imported only when a Preprocessor is built, so that cache hits never pay for it.
+# Bump the version when the preprocessing output changes, to invalidate the corpus cache.
+PREPROCESSING_VERSION = 1
+
+NLTK_RESOURCES = {
+    'stopwords': 'corpora/stopwords',
+    'wordnet': 'corpora/wordnet',
+    'averaged_perceptron_tagger': 'taggers/averaged_perceptron_tagger',
+}
+
+BRACKETS_REGEX = re.compile(r'\((.*?)\)')
+DIGITS_REGEX = re.compile(r'\d+')
+WORD_REGEX = re.compile(r'\w+')
+LEMMA_POS = frozenset(['a', 'n', 'v'])
+
+_preprocessor = None
+_preprocessor_lock = threading.Lock()
 
 
 def is_list_of_strings(lst):
     return bool(lst) and isinstance(lst, list) and all(isinstance(elem, str) for elem in lst)
 
 
-def input_to_list_string(data, preprocessing=False):
-    if type(data) == str:
-        with open(data, "r", encoding='utf-8') as datafile:
-            text = [line.rstrip() for line in datafile if line]
-    elif is_list_of_strings(data):
-        text = data
-    else:
-        raise ValueError('data should be a path or a list of strings')
+def input_to_list_string(data, preprocessing=False, workers=None, cache=True):
+    """ Read the corpus as a list of strings.
+
+    :param data: The corpus as path, list of strings or TokenizedCorpus
+    :param bool preprocessing: If true, apply preprocessing to the corpus
+    :param int workers: Number of processes used for preprocessing
+    :param bool cache: If true, preprocessed corpora are read from and stored in the corpus cache
+    """
+    text = list(_input_lines(data))
     if preprocessing:
-        text = [preprocess(doc) for doc in text]
+        # the same key as input_to_path, so that both share the cache entry
+        key = corpus_fingerprint(data, preprocessing) if cache else None
+        cached = corpus_cache.get(key) if cache else None
+        if cached is not None:
+            return cached
+
+        text = list(preprocess_corpus(text, workers=workers))
+        if cache:
+            corpus_cache.put(key, text)
     return text
 
 
+def input_to_list_tokens(data, preprocessing=False, workers=None):
+    """ Read the corpus as a list of documents, each one a list of tokens.
+
+    :param data: The corpus as path, list of strings or TokenizedCorpus
+    :param bool preprocessing: If true, apply preprocessing to the corpus
+    :param int workers: Number of processes used for preprocessing
+    """
+    if is_tokenized_corpus(data) and not preprocessing:
+        return list(_tokenized(data).tokens())
+    return [doc.split() for doc in input_to_list_string(data, preprocessing, workers)]
+
+
+def input_to_corpus(data, preprocessing=False, workers=None):
+    """ Read the corpus as a restartable iterable, without loading it in memory.
+
+    :param data: The corpus as path, list of strings or TokenizedCorpus
+    :param bool preprocessing: If true, apply preprocessing to the corpus
+    :param int workers: Number of processes used for preprocessing
+    :returns: a TokenizedCorpus if data is a compiled corpus, a StreamingCorpus otherwise
+    """
+    if is_tokenized_corpus(data) and not preprocessing:
+        return _tokenized(data)
+    return StreamingCorpus(input_to_path(data, preprocessing, workers))
+
+
+def _tokenized(data):
+    return data if isinstance(data, TokenizedCorpus) else TokenizedCorpus(data)
+
+
+def input_to_path(data, preprocessing=False, workers=None):
+    """ Path of a file containing the corpus, one document per line.
+
+    Corpora which are not already available as a file (preprocessed corpora or lists of strings) are written in
+    the corpus cache. The corpus is streamed, without being loaded in memory.
+
+    :param data: The corpus as path, list of strings or TokenizedCorpus
+    :param bool preprocessing: If true, apply preprocessing to the corpus
+    :param int workers: Number of processes used for preprocessing
+    """
+    if type(data) == str and not preprocessing and not is_tokenized_corpus(data):
+        return data
+
+    key = corpus_fingerprint(data, preprocessing)
+    path = corpus_cache.file(key)
+    if path is None:
+        text = _input_lines(data)
+        if preprocessing:
+            text = preprocess_corpus(text, workers=workers)
+        path = corpus_cache.put(key, text)
+    return path
+
+
+def _input_lines(data):
+    if is_tokenized_corpus(data):
+        return _tokenized(data).texts()
+    elif type(data) == str:
+        return read_lines(data)
+    elif is_list_of_strings(data):
+        return data
+    raise ValueError('data should be a path or a list of strings')
+
+
+def corpus_fingerprint(data, preprocessing=False):
+    """ Content hash of the corpus, taking into account the preprocessing setting.
+
+    A TokenizedCorpus is hashed from its arrays, so that its fingerprint differs from the one of the same documents
+    given as text.
+
+    :param data: The corpus as path, list of strings or TokenizedCorpus
+    :param bool preprocessing: If true, the preprocessed corpus is meant
+    """
+    if is_tokenized_corpus(data):
+        # the arrays are hashed as stored, without decoding the documents
+        corpus = _tokenized(data)
+        settings = {'preprocessing': PREPROCESSING_VERSION} if preprocessing else {}
+        return array_fingerprint([corpus.vocabulary, corpus.token_ids, corpus.offsets], **settings)
+    return _corpus_key(_input_lines(data), preprocessing)
+
+
+def _corpus_key(text, preprocessing):
+    if preprocessing:
+        return fingerprint(text, preprocessing=PREPROCESSING_VERSION)
+    return fingerprint(text)
+
+
+class StreamingCorpus:
+    """ Restartable corpus read lazily from a file, one document per line, tokens space separated.
+
+    Iterating on the corpus yields the BoW vectors of the documents, once a dictionary is set.
+    It can be iterated any number of times, so it can be given directly to gensim models.
+
+    :param str path: Path of the corpus file
+    :param dictionary: The gensim Dictionary used for computing the BoW
+    """
+
+    def __init__(self, path, dictionary=None):
+        self.path = path
+        self.dictionary = dictionary
+        self.length = None
+
+    def tokens(self):
+        """Iterate on the documents as lists of tokens"""
+        for line in read_lines(self.path):
+            yield line.split()
+
+    def __iter__(self):
+        if self.dictionary is None:
+            raise ValueError('a dictionary is required for iterating on the BoW')
+        for tokens in self.tokens():
+            yield self.dictionary.doc2bow(tokens)
+
+    def __len__(self):
+        if self.length is None:
+            self.length = sum(1 for _ in read_lines(self.path))
+        return self.length
+
+
 def _init():
-    global init_done
-    nltk.download('stopwords')
-    nltk.download('wordnet')
-    nltk.download('averaged_perceptron_tagger')
-    init_done = True
+    """Download the NLTK resources that are not available yet."""
+    import nltk
+
+    for name, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            nltk.download(name)
+
+
+class Preprocessor:
+    """Text preprocessor holding its NLTK resources.
+
+    Stopwords, tagger, lemmatizer and regexes are loaded once at construction, so that the object can be reused
+    for any number of documents. Lemmas are kept in a bounded LRU cache keyed by (word, POS).
+
+    :param int lemma_cache_size: Maximum number of lemmas to keep in cache
+    """
+
+    def __init__(self, lemma_cache_size=2 ** 16):
+        import nltk
+        from nltk.tag.perceptron import PerceptronTagger
+
+        _init()
+
+        self.stopwords = frozenset(nltk.corpus.stopwords.words('english'))
+        self.tagger = PerceptronTagger()
+        self.lemmatizer = nltk.stem.WordNetLemmatizer()
+        self.lemmatize = lru_cache(maxsize=lemma_cache_size)(self.lemmatizer.lemmatize)
+
+    def __call__(self, text, strip_brackets=False):
+        """ Preprocess a text. See `preprocess` for the details of the pipeline.
+
+        :param str text: the text to be preprocessed
+        :param bool strip_brackets: If True, the content inside brackets is excluded
+        """
+        if strip_brackets:
+            text = BRACKETS_REGEX.sub(' ', text)
+        text = DIGITS_REGEX.sub('', text)
+        text = [w for w in WORD_REGEX.findall(text.lower()) if len(w) >= 3 and w not in self.stopwords]
+
+        lemmas = []
+        for word, tag in self.tagger.tag(text):
+            pos = tag[0].lower()
+            lemmas.append(self.lemmatize(word, pos if pos in LEMMA_POS else 'n'))
+        return ' '.join(lemmas)
+
+
+def get_preprocessor():
+    """Return the Preprocessor shared by the whole process, creating it at the first call."""
+    global _preprocessor
+
+    if _preprocessor is None:
+        with _preprocessor_lock:
+            if _preprocessor is None:
+                _preprocessor = Preprocessor()
+    return _preprocessor
 
 
 def preprocess(text, strip_brackets=False):
@@ -43,21 +241,33 @@ def preprocess(text, strip_brackets=False):
     :param str text: the text to be preprocessed
     :param bool strip_brackets: If True, the content inside brackets is excluded
     """
-    global init_done
+    return get_preprocessor()(text, strip_brackets)
 
-    if not init_done:
-        _init()
 
-    if strip_brackets:
-        text = re.sub(r'\((.*?)\)', ' ', text)
-    text = re.sub(r'\d+', '', text)
-    text = nltk.tokenize.RegexpTokenizer(r'\w+').tokenize(text.lower())
-    text = [w for w in text if w not in nltk.corpus.stopwords.words('english')]
+def preprocess_corpus(docs, workers=None, chunksize=64, strip_brackets=False):
+    """ Preprocess a collection of documents using a pool of processes.
 
-    lem = nltk.stem.WordNetLemmatizer()
+    Results are streamed back in the same order of the input documents.
 
-    text = [w for w in text if len(w) >= 3]
-    text = [lem.lemmatize(i, j[0].lower()) if j[0].lower() in ['a', 'n', 'v']
-            else lem.lemmatize(i) for i, j in pos_tag(text)]
-    text = ' '.join(text)
-    return text
+    :param docs: Iterable of documents to be preprocessed
+    :param int workers: Number of processes. If None, use all the available cores. If 1, run in the current process
+    :param int chunksize: Number of documents sent to a worker at a time
+    :param bool strip_brackets: If True, the content inside brackets is excluded
+    :returns: a generator of preprocessed documents
+    """
+    func = partial(preprocess, strip_brackets=strip_brackets)
+    workers = workers or os.cpu_count() or 1
+    if hasattr(docs, '__len__') and len(docs) <= chunksize:
+        workers = 1
+    # daemonic processes, e.g. the workers of a pool, can not start a pool themselves
+    if multiprocessing.current_process().daemon:
+        workers = 1
+
+    if workers == 1:
+        yield from map(func, docs)
+        return
+
+    # download missing resources once, before forking
+    _init()
+    with multiprocessing.Pool(workers, initializer=get_preprocessor) as pool:
+        yield from pool.imap(func, docs, chunksize)
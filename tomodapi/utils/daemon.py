@@ -0,0 +1,134 @@
+import logging
+import threading
+import multiprocessing
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def _serve(conn, model_class, model_path):
+    """Main loop of the worker process: load the model once, then execute the requests received on `conn`."""
+    m = model_class() if model_path is None else model_class(model_path)
+    m.load()
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+
+        method, args, kwargs = request
+        try:
+            conn.send(('ok', getattr(m, method)(*args, **kwargs)))
+        except Exception as e:
+            conn.send(('error', e))
+
+
+class ModelWorker:
+    """ Long-lived local process holding a loaded model, so that the loading cost is paid once.
+
+    Requests are sent over a pipe and executed one at a time. The worker is started at the first request, and it is
+    restarted if it dies. A single worker can be shared by any number of threads.
+
+    :param model_class: The class of the model, e.g. LdaModel
+    :param str model_path: Folder of the model. If None, the default one of the model class
+    :param float timeout: Maximum time in seconds for a request. If None, wait indefinitely
+    """
+
+    def __init__(self, model_class, model_path=None, timeout=None):
+        self.model_class = model_class
+        self.model_path = model_path
+        self.timeout = timeout
+        self.process = None
+        self.conn = None
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self.log = logging.getLogger(self.__class__.__name__)
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_serve, args=(child_conn, self.model_class, self.model_path),
+                                               daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.log.debug(f'started worker {self.process.pid} for {self.model_class.__name__}')
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def shutdown(self):
+        """Stop the worker once the running request is completed. It is started again at the next request."""
+        with self._lock:
+            self.stop()
+
+    def restart(self):
+        self.log.warning(f'restarting the worker of {self.model_class.__name__}')
+        self.stop()
+        self.start()
+        self.restarts += 1
+
+    def call(self, method, *args, **kwargs):
+        """ Execute a method of the model in the worker.
+
+        If the worker crashed, it is restarted and the request is sent again once.
+
+        :param str method: Name of the model method, e.g. predict
+        :returns: the result of the method. Exceptions raised by the method are raised again here
+        """
+        with self._lock:
+            for attempt in range(2):
+                if self.process is None:
+                    self.start()
+                elif not self.alive:
+                    self.restart()
+
+                try:
+                    self.conn.send((method, args, kwargs))
+                    completed = self.conn.poll(self.timeout)
+                    if completed:
+                        status, result = self.conn.recv()
+                except (EOFError, OSError):
+                    # the worker died during the request
+                    if attempt == 0:
+                        self.restart()
+                        continue
+                    raise
+
+                if not completed:
+                    self.restart()
+                    raise TimeoutError(f'{method} did not complete in {self.timeout} seconds')
+                if status == 'error':
+                    raise result
+                return result
+
+    def __getattr__(self, method):
+        if method.startswith('_') or method not in dir(self.model_class):
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self.call(method, *args, **kwargs)
+
+
+def get_worker(model_class, model_path=None, timeout=None):
+    """Return the worker shared by the whole process for a model, creating it at the first call."""
+    key = (model_class, model_path)
+    with _workers_lock:
+        if key not in _workers:
+            _workers[key] = ModelWorker(model_class, model_path, timeout)
+        return _workers[key]
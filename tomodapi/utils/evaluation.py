@@ -0,0 +1,109 @@
+import numpy as np
+import scipy.sparse
+
+NMI_AVERAGES = ['arithmetic', 'min', 'max', 'geometric']
+METRICS = ['purity', 'homogeneity', 'completeness', 'v-measure', 'nmi'] + ['nmi_' + a for a in NMI_AVERAGES]
+
+
+def top_labels(labels_pred):
+    """Top-1 topic of each prediction, given either as topic ids or as lists of (topic, confidence)"""
+    if len(labels_pred) > 0 and type(labels_pred[0]) == list:
+        return [x[0][0] if len(x) > 0 else 0 for x in labels_pred]
+    return labels_pred
+
+
+def contingency(labels_pred, labels_true):
+    """ Sparse contingency matrix between ground truth classes and predicted clusters.
+
+    The labels are encoded with `np.unique`, so that any hashable and sortable labels are accepted.
+
+    :param labels_pred: Predicted cluster of each document
+    :param labels_true: Ground truth class of each document
+    :returns: a sparse classes x clusters matrix of the number of documents in each pair
+    """
+    classes, class_idx = np.unique(np.asarray(labels_true), return_inverse=True)
+    clusters, cluster_idx = np.unique(np.asarray(top_labels(labels_pred)), return_inverse=True)
+    if len(class_idx) != len(cluster_idx):
+        raise ValueError('labels_pred and labels_true should have the same length')
+    return scipy.sparse.coo_matrix((np.ones(len(class_idx), dtype=np.int64), (class_idx, cluster_idx)),
+                                   shape=(len(classes), len(clusters))).tocsr()
+
+
+def _entropy(marginals, n):
+    p = marginals / n[:, None]
+    return -np.sum(p * np.log(np.where(p > 0, p, 1)), axis=1)
+
+
+def contingency_scores(counts, rows, cols, shape):
+    """ Clustering scores computed from the non-zero cells of contingency matrices.
+
+    The matrices share the same non-zero pattern, so that many resamples of the same contingency matrix are
+    scored at once. The scores are the ones of scikit-learn.
+
+    :param counts: B x C matrix of the counts of the C cells in each of the B contingency matrices
+    :param rows: Class of each cell
+    :param cols: Cluster of each cell
+    :param shape: Number of classes and clusters
+    :returns: a dict with the array of the B values of each metric in METRICS
+    """
+    counts = np.atleast_2d(counts).astype(np.float64)
+    n = counts.sum(axis=1)
+    class_marginals = counts @ scipy.sparse.csr_matrix((np.ones(len(rows)), (np.arange(len(rows)), rows)),
+                                                       shape=(len(rows), shape[0]))
+    cluster_marginals = counts @ scipy.sparse.csr_matrix((np.ones(len(cols)), (np.arange(len(cols)), cols)),
+                                                         shape=(len(cols), shape[1]))
+    h_true, h_pred = _entropy(class_marginals, n), _entropy(cluster_marginals, n)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_ratio = np.log(counts * n[:, None]) - np.log(class_marginals[:, rows] * cluster_marginals[:, cols])
+    mi = np.sum(counts / n[:, None] * np.where(counts > 0, log_ratio, 0), axis=1)
+    mi = np.maximum(mi, 0)
+
+    # largest cell of each cluster
+    order = np.argsort(cols, kind='stable')
+    starts = np.flatnonzero(np.diff(cols[order], prepend=-1))
+    purity = np.maximum.reduceat(counts[:, order], starts, axis=1).sum(axis=1) / n
+
+    homogeneity = np.where(h_true > 0, mi / np.where(h_true > 0, h_true, 1), 1.)
+    completeness = np.where(h_pred > 0, mi / np.where(h_pred > 0, h_pred, 1), 1.)
+    hc = homogeneity + completeness
+    v_measure = np.where(hc > 0, 2 * homogeneity * completeness / np.where(hc > 0, hc, 1), 0.)
+
+    scores = {'purity': purity, 'homogeneity': homogeneity, 'completeness': completeness, 'v-measure': v_measure}
+
+    # no split of the data in both labelings
+    single = ((class_marginals > 0).sum(axis=1) == 1) & ((cluster_marginals > 0).sum(axis=1) == 1)
+    averages = {'arithmetic': (h_true + h_pred) / 2, 'min': np.minimum(h_true, h_pred),
+                'max': np.maximum(h_true, h_pred), 'geometric': np.sqrt(h_true * h_pred)}
+    for average in NMI_AVERAGES:
+        normalizer = np.maximum(averages[average], np.finfo('float64').eps)
+        scores['nmi_' + average] = np.where(single, 1., mi / normalizer)
+    scores['nmi'] = scores['nmi_arithmetic']
+    return scores
+
+
+def evaluate_all(labels_pred, labels_true, bootstrap=0, confidence=0.95, random_state=None):
+    """ All the clustering scores from a single contingency matrix.
+
+    The confidence intervals are computed by bootstrap: the documents are resampled with replacement, which is
+    drawing the cells of the contingency matrix from a multinomial distribution, without going back to the labels.
+
+    :param labels_pred: Predicted topics, as topic ids or as lists of (topic, confidence)
+    :param labels_true: Ground truth labels
+    :param int bootstrap: Number of bootstrap resamples. If 0, no confidence interval is computed
+    :param float confidence: Confidence level of the intervals
+    :param int random_state: Seed of the bootstrap
+    :returns: a dict with the value of each metric in METRICS, and the interval [low, high] of each one as
+        `<metric>_ci` if `bootstrap` is set
+    """
+    matrix = contingency(labels_pred, labels_true).tocoo()
+    rows, cols, counts = matrix.row, matrix.col, matrix.data
+    results = {metric: float(v[0]) for metric, v in contingency_scores(counts, rows, cols, matrix.shape).items()}
+
+    if bootstrap:
+        rng = np.random.RandomState(random_state)
+        resamples = rng.multinomial(counts.sum(), counts / counts.sum(), size=bootstrap)
+        tail = (1 - confidence) / 2 * 100
+        for metric, values in contingency_scores(resamples, rows, cols, matrix.shape).items():
+            results[metric + '_ci'] = np.percentile(values, [tail, 100 - tail]).tolist()
+    return results
@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+VECTORS_FILE = 'vectors.npy'
+NORMS_FILE = 'norms.npy'
+VOCABULARY_FILE = 'vocabulary.npy'
+ROWS_FILE = 'rows.npy'
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class GloveStore:
+    """ GloVe embeddings compiled in a binary format, made of:
+    - the vectors, as a float32 matrix in the order of the text file, with their norms;
+    - the vocabulary, as a sorted array of utf-8 encoded words;
+    - the row of each word of the sorted vocabulary in the vector matrix.
+
+    The arrays are stored as .npy files and memory-mapped at loading, so that loading is immediate and several
+    processes share the same pages. Words are looked up with a binary search in the sorted vocabulary.
+
+    :param str path: Folder of the compiled embeddings
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode='r')
+        self.norms = np.load(os.path.join(path, NORMS_FILE), mmap_mode='r')
+        self.vocabulary = np.load(os.path.join(path, VOCABULARY_FILE), mmap_mode='r')
+        self.rows = np.load(os.path.join(path, ROWS_FILE), mmap_mode='r')
+
+    @staticmethod
+    def compile(txt_path, path):
+        """ Compile a GloVe text file, one word per line followed by its vector components.
+
+        :param str txt_path: Path of the GloVe text file
+        :param str path: Folder where to write the compiled embeddings
+        :returns: the compiled GloveStore
+        """
+        with open(txt_path, 'r', encoding='utf-8') as f:
+            n_words = sum(1 for _ in f)
+        with open(txt_path, 'r', encoding='utf-8') as f:
+            size = len(f.readline().rstrip().split(' ')) - 1
+
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent, suffix='.tmp')
+
+        vectors = np.lib.format.open_memmap(os.path.join(tmp, VECTORS_FILE), mode='w+', dtype=np.float32,
+                                            shape=(n_words, size))
+        words = []
+        with open(txt_path, 'r', encoding='utf-8') as f:
+            for i, line in enumerate(f):
+                word, values = line.rstrip().split(' ', 1)
+                words.append(word.encode('utf-8'))
+                vectors[i] = np.array(values.split(' '), dtype=np.float32)
+        vectors.flush()
+
+        words = np.array(words)
+        rows = np.argsort(words, kind='stable')
+        np.save(os.path.join(tmp, NORMS_FILE), np.linalg.norm(vectors, axis=1).astype(np.float32))
+        np.save(os.path.join(tmp, VOCABULARY_FILE), words[rows])
+        np.save(os.path.join(tmp, ROWS_FILE), rows.astype(np.int32))
+        del vectors
+
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # compiled in the meanwhile by another process
+            shutil.rmtree(tmp)
+        return GloveStore(path)
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+    def __contains__(self, word):
+        return self.index([word])[0] >= 0
+
+    def index(self, words):
+        """ Rows of the words in the vector matrix.
+
+        :param words: list of words
+        :returns: an array with the row of each word, -1 for the words which are not in the vocabulary
+        """
+        encoded = [w.encode('utf-8') for w in words]
+        if len(encoded) == 0:
+            return np.zeros(0, dtype=np.int64)
+        keys = np.array(encoded, dtype=self.vocabulary.dtype)
+        pos = np.minimum(np.searchsorted(self.vocabulary, keys), len(self.vocabulary) - 1)
+        found = self.vocabulary[pos] == keys
+        # the words longer than any word of the vocabulary are truncated by the cast
+        found &= np.array([len(w) <= self.vocabulary.itemsize for w in encoded])
+        return np.where(found, self.rows[pos], -1).astype(np.int64)
+
+    def contains(self, words):
+        """Boolean array telling which words are in the vocabulary"""
+        return self.index(words) >= 0
+
+    def similarity(self, word1, word2):
+        """Cosine similarity between two words of the vocabulary"""
+        i, j = self.index([word1, word2])
+        if i < 0 or j < 0:
+            raise KeyError(word1 if i < 0 else word2)
+        return float(np.dot(self.vectors[i], self.vectors[j]) / (self.norms[i] * self.norms[j]))
+
+
+def get_glove(txt_path):
+    """ The GloveStore of a GloVe text file, shared by the whole process.
+
+    The text file is compiled at the first use, in a folder next to it with the same name.
+
+    :param str txt_path: Path of the GloVe text file, e.g. glove.6B.300d.txt
+    """
+    path = os.path.splitext(os.path.abspath(txt_path))[0]
+    with _stores_lock:
+        if path not in _stores:
+            if os.path.isdir(path):
+                _stores[path] = GloveStore(path)
+            else:
+                _stores[path] = GloveStore.compile(txt_path, path)
+        return _stores[path]
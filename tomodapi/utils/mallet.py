@@ -0,0 +1,181 @@
+import os
+import gzip
+import tempfile
+
+import numpy as np
+from gensim import utils
+from gensim.utils import check_output
+
+# Defaults of Mallet's infer-topics
+ITERATIONS = 100
+BURN_IN = 10
+THINNING = 10
+# groups of token positions sampled together by the GibbsInferencer
+BLOCKS = 4
+
+
+def read_state_hyperparameters(path):
+    """ Read alpha and beta from the header of a Mallet state file.
+
+    The header is made of the lines `#doc source pos typeindex type topic`, `#alpha : a_0 a_1 ...` and `#beta : b`.
+
+    :param str path: Path of the state file (state.mallet.gz)
+    :returns: the alpha vector and beta
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        next(f)
+        alpha = np.array(next(f).split()[2:], dtype=np.float64)
+        beta = float(next(f).split()[2])
+    return alpha, beta
+
+
+class GibbsInferencer:
+    """ Topic inference for new documents with a trained LDA, equivalent to Mallet's TopicInferencer.
+
+    The word-topic counts of the training are fixed, so that the documents are independent and they are sampled
+    together. The token positions are split in `blocks` interleaved groups: all the tokens of a group, in all the
+    documents, are resampled at once given the current topics of the other tokens. A sweep costs `blocks`
+    vectorized operations, whatever the number and the length of the documents.
+
+    :param word_topics: K x V matrix of the word counts per topic
+    :param alpha: length K vector of the document-topic prior
+    :param float beta: Topic-word prior
+    :param int iterations: Number of sampling iterations
+    :param int burn_in: Iterations before the first sample is saved
+    :param int thinning: Iterations between saved samples
+    :param int random_seed: Seed for the random generator
+    :param int blocks: Number of groups of token positions updated one after the other in each iteration
+    """
+
+    def __init__(self, word_topics, alpha, beta, iterations=ITERATIONS, burn_in=BURN_IN, thinning=THINNING,
+                 random_seed=None, blocks=BLOCKS):
+        word_topics = np.asarray(word_topics, dtype=np.float64)
+        self.num_topics, self.num_terms = word_topics.shape
+        self.alpha = np.broadcast_to(np.asarray(alpha, dtype=np.float64), (self.num_topics,))
+        self.beta = beta
+        self.iterations = iterations
+        self.burn_in = burn_in
+        self.thinning = thinning
+        self.random_seed = random_seed
+        self.blocks = blocks
+
+        # p(w | k), words x topics, so that the row of a word is contiguous
+        tokens_per_topic = word_topics.sum(axis=1)
+        word_probs = (word_topics + beta) / (tokens_per_topic + self.num_terms * beta)[:, None]
+        self.word_probs = np.ascontiguousarray(word_probs.T)
+
+    @staticmethod
+    def from_mallet(model, iterations=ITERATIONS):
+        """ Build the inferencer of a trained gensim LdaMallet.
+
+        The word-topic counts are the ones loaded by the wrapper, while alpha and beta are read from the Mallet state,
+        as they are possibly optimized during the training.
+
+        :param model: The gensim LdaMallet model
+        :param int iterations: Number of sampling iterations, by default the one of Mallet's infer-topics
+        """
+        alpha, beta = read_state_hyperparameters(model.fstate())
+        return GibbsInferencer(model.word_topics, alpha, beta, iterations=iterations,
+                               random_seed=model.random_seed or None)
+
+    def infer(self, docs):
+        """ Infer the topic distribution of documents.
+
+        :param docs: list of documents, as gensim BoW vectors
+        :returns: a D x K matrix, where each row is the topic distribution of a document
+        """
+        K, D = self.num_topics, len(docs)
+        rng = np.random.RandomState(self.random_seed)
+
+        # all the tokens in flat arrays, with their document and their position in it
+        docs = [[(w, int(c)) for w, c in doc if w < self.num_terms] for doc in docs]
+        lengths = np.array([sum(c for _, c in doc) for doc in docs], dtype=np.int64)
+        tokens = np.array([w for doc in docs for w, c in doc for _ in range(c)], dtype=np.int64)
+        doc_ids = np.repeat(np.arange(D), lengths)
+        positions = np.arange(len(tokens)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        groups = [np.flatnonzero(positions % self.blocks == b) for b in range(self.blocks)]
+        groups = [(group, doc_ids[group], self.word_probs[tokens[group]]) for group in groups if len(group)]
+
+        topics = rng.randint(K, size=len(tokens))
+        cells = doc_ids * K
+        doc_topics = np.bincount(cells + topics, minlength=D * K).reshape(D, K).astype(np.float64)
+
+        result = np.zeros((D, K), dtype=np.float64)
+        for iteration in range(1, self.iterations + 1):
+            for group, d, probs in groups:
+                counts = doc_topics[d]
+                counts[np.arange(len(group)), topics[group]] -= 1
+
+                p = np.cumsum((self.alpha + counts) * probs, axis=1)
+                new = (p < (rng.random_sample(len(group)) * p[:, -1])[:, None]).sum(axis=1)
+                topics[group] = np.minimum(new, K - 1)
+                doc_topics = np.bincount(cells + topics, minlength=D * K).reshape(D, K).astype(np.float64)
+
+            if iteration > self.burn_in and (iteration - self.burn_in) % self.thinning == 0:
+                result += self.alpha + doc_topics
+
+        if not result.any():
+            result = self.alpha + doc_topics
+        return result / result.sum(axis=1, keepdims=True)
+
+
+def _is_sparse(parts):
+    return len(parts) % 2 == 0 and all(p.isdigit() for p in parts[0::2]) and not any(p.isdigit() for p in parts[1::2])
+
+
+def read_doctopics(path, num_topics):
+    """ Parse the doc-topics output of Mallet infer-topics.
+
+    Both the dense format of Mallet 2.0.8 (`doc name p_0 p_1 ...`) and the sparse one of the previous versions
+    (`doc name topic proportion topic proportion ...`) are supported. A row is sparse when its fields alternate topic
+    ids and proportions, as Mallet always writes the proportions as decimals, so that the format is recognized also
+    when a sparse row has `num_topics` fields.
+
+    :param str path: Path of the doc-topics file
+    :param int num_topics: Number of topics
+    :returns: a D x K matrix, where each row is the topic distribution of a document
+    """
+    rows = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('#') or not line.strip():
+                continue
+            parts = line.split()[2:]
+            row = np.zeros(num_topics, dtype=np.float64)
+            if _is_sparse(parts):
+                row[np.array(parts[0::2], dtype=np.int64)] = np.array(parts[1::2], dtype=np.float64)
+            else:
+                row[:] = np.array(parts, dtype=np.float64)
+            rows.append(row)
+    return np.array(rows).reshape(-1, num_topics)
+
+
+def mallet_infer(model, corpus):
+    """ Infer the topic distribution of many documents with a single run of the Mallet inferencer.
+
+    The documents are written in one instance file, so that the whole corpus costs one `import-file` and one
+    `infer-topics`, whatever its size. The files of each call are written in their own temporary folder rather than
+    under the model prefix, so that concurrent calls on the same model never share them.
+
+    :param model: The gensim LdaMallet model
+    :param corpus: list of documents, as gensim BoW vectors
+    :returns: a D x K matrix, where each row is the topic distribution of a document
+    """
+    with tempfile.TemporaryDirectory(prefix='mallet') as folder:
+        corpus_txt = os.path.join(folder, 'corpus.txt')
+        instances = os.path.join(folder, 'corpus.mallet.infer')
+        doctopics = os.path.join(folder, 'doctopics.txt.infer')
+
+        # as LdaMallet.convert_input, with the pipe of the training instances
+        with utils.open(corpus_txt, 'wb') as fout:
+            model.corpus2mallet(corpus, fout)
+        cmd = model.mallet_path + ' import-file --preserve-case --keep-sequence --remove-stopwords ' \
+                                  '--token-regex "\\S+" --input %s --output %s --use-pipe-from %s'
+        check_output(args=cmd % (corpus_txt, instances, model.fcorpusmallet()), shell=True)
+
+        cmd = model.mallet_path + ' infer-topics --input %s --inferencer %s --output-doc-topics %s ' \
+                                  '--num-iterations %s --doc-topics-threshold %s --random-seed %s'
+        cmd = cmd % (instances, model.finferencer(), doctopics, model.iterations, model.topic_threshold,
+                     str(model.random_seed))
+        check_output(args=cmd, shell=True)
+        return read_doctopics(doctopics, model.num_topics)
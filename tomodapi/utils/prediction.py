@@ -0,0 +1,157 @@
+import os
+import json
+import itertools
+import collections
+import multiprocessing
+
+import numpy as np
+
+from .corpus import read_lines
+
+_model = None
+
+
+def read_chunks(path, chunksize, start=0):
+    """ Read a corpus file by chunks of lines.
+
+    :param str path: Path of the corpus, one document per line
+    :param int chunksize: Number of lines of each chunk
+    :param int start: Number of lines to skip at the beginning
+    :returns: a generator of lists of lines
+    """
+    lines = itertools.islice(read_lines(path), start, None)
+    while True:
+        chunk = list(itertools.islice(lines, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def to_predictions(scores, top, sparse=False):
+    """ Convert the output of `predict_batch` to lists of (topic, score), as returned by `predict`.
+
+    :param scores: D x K matrix of topic scores
+    :param top: D x topn matrix with the most probable topics
+    :param bool sparse: If True, the topics with score 0 are left out, as for models with sparse predictions
+    """
+    return [[(int(topic), float(scores[i, topic])) for topic in row if not sparse or scores[i, topic] != 0]
+            for i, row in enumerate(top)]
+
+
+def _init_worker(model_class, model_path):
+    global _model
+    _model = model_class(model_path)
+    _model.load()
+
+
+def _predict_chunk(texts, topn, kwargs):
+    return _model.predict_batch(texts, topn=topn, **kwargs)
+
+
+def batch_predictions(model, chunks, topn=5, workers=None, **kwargs):
+    """ Predict the topics of chunks of texts with `predict_batch`, optionally in a pool of processes.
+
+    Each worker process loads its own copy of the model. At most two chunks per worker are pending at a time, so
+    that the input is read only as fast as it is predicted.
+
+    :param model: The model
+    :param chunks: Iterable of lists of texts
+    :param int topn: Number of most probable topics to return
+    :param int workers: Number of processes. If None or 1, predict in the current process
+    :param kwargs: Any other argument of the `predict_batch` of the model
+    :returns: a generator of the outputs of `predict_batch` for each chunk, in the input order
+    """
+    if not workers or workers == 1:
+        for texts in chunks:
+            yield model.predict_batch(texts, topn=topn, **kwargs)
+        return
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(model.__class__, model.model_path)) as pool:
+        pending = collections.deque()
+        for texts in chunks:
+            pending.append(pool.apply_async(_predict_chunk, (texts, topn, kwargs)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def _read_checkpoint(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_checkpoint(path, state):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+
+def predict_to_file(model, datapath, output, topn=5, chunksize=1000, workers=None, resume=False, **kwargs):
+    """ Predict the topics of a corpus file, writing the predictions incrementally.
+
+    The output format is chosen from the extension of `output`:
+    - `.npy`, the D x K matrix of topic scores, as float32;
+    - otherwise NDJSON, one line per document with the list of its `topn` (topic, score) pairs.
+
+    The progress is saved in `<output>.checkpoint` before creating the output and after each chunk, and the checkpoint
+    is removed only once all the documents are written. With `resume`, a prediction interrupted is continued from the
+    last checkpoint, and an output without checkpoint is complete.
+
+    :param model: The model
+    :param str datapath: Path of the corpus, one document per line
+    :param str output: Path of the output file
+    :param int topn: Number of most probable topics to return, only for NDJSON
+    :param int chunksize: Number of documents predicted at a time
+    :param int workers: Number of processes. If None or 1, predict in the current process
+    :param bool resume: If True, continue from the checkpoint of a previous run
+    :param kwargs: Any other argument of the `predict_batch` of the model
+    :returns: the number of predicted documents
+    """
+    checkpoint = output + '.checkpoint'
+    state = _read_checkpoint(checkpoint) if resume else None
+    if resume and state is None and os.path.exists(output):
+        return sum(1 for _ in read_lines(datapath))
+    if state is None:
+        # the checkpoint exists as long as the output is incomplete, so it is written before creating the output
+        state = {'documents': 0, 'offset': 0}
+        _write_checkpoint(checkpoint, state)
+
+    npy = output.endswith('.npy')
+    if npy:
+        # created at the first chunk, once the number of topics is known
+        matrix = np.load(output, mmap_mode='r+') if state['documents'] else None
+        num_docs = len(matrix) if matrix is not None else sum(1 for _ in read_lines(datapath))
+    else:
+        f = open(output, 'r+b' if state['documents'] else 'wb')
+        # drop what was written after the checkpoint
+        f.truncate(state['offset'])
+        f.seek(state['offset'])
+
+    try:
+        chunks = read_chunks(datapath, chunksize, start=state['documents'])
+        for scores, top in batch_predictions(model, chunks, topn, workers, **kwargs):
+            start = state['documents']
+            if npy:
+                if matrix is None:
+                    matrix = np.lib.format.open_memmap(output, mode='w+', dtype=np.float32,
+                                                       shape=(num_docs, scores.shape[1]))
+                matrix[start:start + len(scores)] = scores
+                matrix.flush()
+            else:
+                for row in to_predictions(scores, top, model.sparse_predictions):
+                    f.write((json.dumps(row) + '\n').encode('utf-8'))
+                f.flush()
+                state['offset'] = f.tell()
+            state['documents'] = start + len(scores)
+            _write_checkpoint(checkpoint, state)
+    finally:
+        if not npy:
+            f.close()
+
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return state['documents']
@@ -0,0 +1,103 @@
+import os
+import argparse
+from array import array
+
+import numpy as np
+
+VOCABULARY_FILE = 'vocabulary.npy'
+TOKENS_FILE = 'tokens.npy'
+OFFSETS_FILE = 'offsets.npy'
+
+
+def is_tokenized_corpus(data):
+    """True if data is a TokenizedCorpus or the folder of a compiled corpus"""
+    return isinstance(data, TokenizedCorpus) or \
+           (type(data) == str and os.path.isfile(os.path.join(data, TOKENS_FILE)))
+
+
+class TokenizedCorpus:
+    """ Corpus compiled in a binary format, made of:
+    - the vocabulary, as an array of strings;
+    - the token ids of all the documents, concatenated in a single int32 array;
+    - the offsets of the documents in the token array, so that document i is tokens[offsets[i]:offsets[i+1]].
+
+    The arrays are stored as .npy files and memory-mapped at loading, so that several processes can share them.
+    Iterating on the corpus yields the BoW vectors of the documents, once a dictionary is set.
+
+    :param str path: Folder of the compiled corpus
+    :param str mmap_mode: Memory-map mode for numpy.load. If None, the arrays are read in memory
+    """
+
+    def __init__(self, path, mmap_mode='r'):
+        self.path = path
+        self.vocabulary = np.load(os.path.join(path, VOCABULARY_FILE), mmap_mode=mmap_mode)
+        self.token_ids = np.load(os.path.join(path, TOKENS_FILE), mmap_mode=mmap_mode)
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode=mmap_mode)
+        self.dictionary = None
+        self._word2id = None
+
+    @staticmethod
+    def compile(data, path, preprocessing=False, workers=None):
+        """ Compile a corpus in the binary format.
+
+        :param data: The corpus as path or list of strings
+        :param str path: Folder where to write the compiled corpus
+        :param bool preprocessing: If true, apply preprocessing to the corpus
+        :param int workers: Number of processes used for preprocessing
+        :returns: the compiled TokenizedCorpus
+        """
+        from .corpus import input_to_path, read_lines
+
+        word2id = {}
+        token_ids = array('i')
+        offsets = array('q', [0])
+        for line in read_lines(input_to_path(data, preprocessing, workers)):
+            token_ids.extend(word2id.setdefault(w, len(word2id)) for w in line.split())
+            offsets.append(len(token_ids))
+
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, VOCABULARY_FILE), np.array(list(word2id), dtype=str))
+        np.save(os.path.join(path, TOKENS_FILE), np.frombuffer(token_ids, dtype=np.int32))
+        np.save(os.path.join(path, OFFSETS_FILE), np.frombuffer(offsets, dtype=np.int64))
+
+        return TokenizedCorpus(path)
+
+    @property
+    def word2id(self):
+        if self._word2id is None:
+            self._word2id = {w: i for i, w in enumerate(self.vocabulary.tolist())}
+        return self._word2id
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        """Token ids of the i-th document"""
+        return self.token_ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def tokens(self):
+        """Iterate on the documents as lists of tokens"""
+        for i in range(len(self)):
+            yield self.vocabulary[self[i]].tolist()
+
+    def texts(self):
+        """Iterate on the documents as strings, tokens space separated"""
+        for tokens in self.tokens():
+            yield ' '.join(tokens)
+
+    def __iter__(self):
+        if self.dictionary is None:
+            raise ValueError('a dictionary is required for iterating on the BoW')
+        for tokens in self.tokens():
+            yield self.dictionary.doc2bow(tokens)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compile a corpus in the memory-mapped binary format')
+    parser.add_argument('data', help='Corpus file, one document per line')
+    parser.add_argument('output', help='Output folder')
+    parser.add_argument('--preprocessing', action='store_true', help='Apply preprocessing to the corpus')
+    args = parser.parse_args()
+
+    corpus = TokenizedCorpus.compile(args.data, args.output, preprocessing=args.preprocessing)
+    print(f'Compiled {len(corpus)} documents, {len(corpus.token_ids)} tokens, {len(corpus.vocabulary)} words')